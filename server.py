@@ -1,18 +1,53 @@
+import asyncio
+import atexit
 import base64
+import bisect
+import codecs
+import cProfile
+import ctypes
+import fcntl
+import glob
+import gzip
+import hashlib
+import html
+import http.client
 import http.server
 import io
 import json
 import logging
+import logging.handlers
 import os
+import pstats
+import queue
+import random
+import re
+import select
 import shutil
+import signal
 import socket
+import socketserver
+import ssl
+import struct
 import subprocess
 import tarfile
+import tempfile
+import threading
+import time
+import tracemalloc
 import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
 from pathlib import Path
 from urllib.parse import parse_qs, urlparse
 
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 APP_ROOT = Path("/app")
 STATIC_DIR = APP_ROOT / "static"
 TEMPLATE_CONTENT = APP_ROOT / "content" / "content.json"
@@ -23,11 +58,60 @@ CADDYFILE_PATH = CONFIG_BASE / "Caddyfile"
 BACKUP_DIR = CONFIG_BASE / "backup"
 CONTENT_BACKUP_DIR = CONFIG_BASE / "content-backup"
 RUNTIME_STATIC = RUNTIME_BASE / "static"
-TEMP_CADDYFILE = Path("/tmp/caddyfile.upload")
+EXPORT_ROOT = RUNTIME_BASE / "site"
+EXPORT_SNIPPET = RUNTIME_BASE / "caddylander-site.caddy"
+HEALTH_SNAPSHOT = RUNTIME_BASE / "health.json"
 CADDY_BIN = Path("/app/vendor/caddy/caddy")
+LOCK_DIR = Path("/tmp/caddylander-locks")
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", "/tmp/caddylander-profiles"))
 
 DEFAULT_ADMIN_PASSWORD = "caddyLander"
 ADMIN_PASSWORD = os.environ.get("ADMIN_PASSWORD", DEFAULT_ADMIN_PASSWORD)
+FILE_CACHE_MAX_BYTES = int(os.environ.get("FILE_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+COMPRESSIBLE_SUFFIXES = {".html", ".css", ".js", ".json", ".svg", ".ico", ".txt", ".map"}
+LANDING_RENDER = os.environ.get("LANDING_RENDER", "server").lower()
+STATIC_EXPORT = os.environ.get("STATIC_EXPORT", "").lower() in {"1", "true", "yes", "on"}
+EXPORT_UPSTREAM = os.environ.get("EXPORT_UPSTREAM", "caddylander:8080")
+KEEPALIVE_TIMEOUT = float(os.environ.get("KEEPALIVE_TIMEOUT", "15"))
+MAX_BODY_BYTES = int(os.environ.get("MAX_BODY_BYTES", str(8 * 1024 * 1024)))
+FAVICON_MAX_BYTES = int(os.environ.get("FAVICON_MAX_BYTES", str(1024 * 1024)))
+SMALL_BODY_BYTES = 64 * 1024
+BODY_READ_TIMEOUT = float(os.environ.get("BODY_READ_TIMEOUT", "30"))
+HOST_INFO_TTL = float(os.environ.get("HOST_INFO_TTL", "60"))
+HEALTH_PROBE_INTERVAL = float(os.environ.get("HEALTH_PROBE_INTERVAL", "0"))
+HEALTH_PROBE_TIMEOUT = float(os.environ.get("HEALTH_PROBE_TIMEOUT", "5"))
+HEALTH_PROBE_WORKERS = max(1, int(os.environ.get("HEALTH_PROBE_WORKERS", "8")))
+HEALTH_PROBE_VERIFY_TLS = os.environ.get("HEALTH_PROBE_VERIFY_TLS", "1").lower() in {"1", "true", "yes", "on"}
+CHANGE_WATCH = os.environ.get("CHANGE_WATCH", "inotify").lower()
+CHANGE_POLL_INTERVAL = float(os.environ.get("CHANGE_POLL_INTERVAL", "2"))
+SSE_QUEUE_SIZE = max(1, int(os.environ.get("SSE_QUEUE_SIZE", "16")))
+SSE_MAX_CLIENTS = max(1, int(os.environ.get("SSE_MAX_CLIENTS", "64")))
+SSE_ADMIN_CLIENTS = max(1, int(os.environ.get("SSE_ADMIN_CLIENTS", "4")))
+SSE_HEARTBEAT = 15
+PROFILE_KEEP = max(1, int(os.environ.get("PROFILE_KEEP", "20")))
+PROFILE_MAX_REQUESTS = 100
+KEEPALIVE_MAX_REQUESTS = int(os.environ.get("KEEPALIVE_MAX_REQUESTS", "100"))
+KEEPALIVE_DRAIN_MAX = 64 * 1024
+BACKUP_KEEP = max(1, int(os.environ.get("BACKUP_KEEP", "200")))
+VALIDATION_CACHE_SIZE = int(os.environ.get("VALIDATION_CACHE_SIZE", "64"))
+VALIDATION_CONCURRENCY = max(1, int(os.environ.get("VALIDATION_CONCURRENCY", "2")))
+LINT_DEBOUNCE = float(os.environ.get("LINT_DEBOUNCE", "0.15"))
+BACKUP_INDEX_RECHECK = float(os.environ.get("BACKUP_INDEX_RECHECK", "1"))
+BACKUP_PATCH_CHAIN = max(0, int(os.environ.get("BACKUP_PATCH_CHAIN", "50")))
+STATIC_INDEX_INTERVAL = float(os.environ.get("STATIC_INDEX_INTERVAL", "10"))
+SERVER_ENGINE = os.environ.get("SERVER_ENGINE", "threading").lower()
+ASYNC_WORKERS = int(os.environ.get("ASYNC_WORKERS", str(min(32, (os.cpu_count() or 1) + 4))))
+ASYNC_WRITE_CHUNK = 64 * 1024
+WORKERS = max(1, int(os.environ.get("WORKERS", "1")))
+UNIX_SOCKET = os.environ.get("UNIX_SOCKET", "")
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json").lower()
+LOG_FILE = os.environ.get("LOG_FILE", "")
+LOG_FILE_MAX_BYTES = int(os.environ.get("LOG_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_FILE_BACKUPS = max(0, int(os.environ.get("LOG_FILE_BACKUPS", "5")))
+ACCESS_LOG = os.environ.get("ACCESS_LOG", "1").lower() in {"1", "true", "yes", "on"}
+ACCESS_LOG_SAMPLE = min(1.0, max(0.0, float(os.environ.get("ACCESS_LOG_SAMPLE", "1"))))
+LISTEN_ADDRESS = ("0.0.0.0", int(os.environ.get("PORT", "8080")))
 
 LOGO_LINES = [
     "                       █████     █████            █████                                █████",
@@ -53,11 +137,87 @@ def _sanitize_logo_lines(lines: list[str]) -> list[str]:
         for line in lines
     ]
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-)
+
+class JsonLineFormatter(logging.Formatter):
+    """One JSON object per line; fields passed as extra={"fields": {...}} become top-level keys."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).astimezone().isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queues records as they are, leaving all formatting to the listener thread."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class LogPipeline:
+    """Routes every log record through one queue to a listener thread that formats and writes it.
+
+    Request threads only enqueue. Threads do not survive fork, so each
+    pre-forked worker starts its own listener on a fresh queue.
+    """
+
+    def __init__(self, handlers: list[logging.Handler]):
+        self.handlers = handlers
+        self.queue_handler = DeferredQueueHandler(queue.SimpleQueue())
+        self._listener: logging.handlers.QueueListener | None = None
+
+    def start(self) -> None:
+        self._listener = logging.handlers.QueueListener(
+            self.queue_handler.queue, *self.handlers, respect_handler_level=True
+        )
+        self._listener.start()
+
+    def restart_after_fork(self) -> None:
+        # Anything queued before the fork is the parent's to write
+        self.queue_handler.queue = queue.SimpleQueue()
+        self.start()
+
+    def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+
+
+def configure_logging() -> LogPipeline:
+    if LOG_FORMAT == "json":
+        formatter = JsonLineFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
+    handlers: list[logging.Handler] = [logging.StreamHandler()]
+    if LOG_FILE:
+        Path(LOG_FILE).parent.mkdir(parents=True, exist_ok=True)
+        handlers.append(logging.handlers.RotatingFileHandler(
+            LOG_FILE, maxBytes=LOG_FILE_MAX_BYTES, backupCount=LOG_FILE_BACKUPS, encoding="utf-8"
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    pipeline = LogPipeline(handlers)
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.handlers[:] = [pipeline.queue_handler]
+    pipeline.start()
+    atexit.register(pipeline.stop)
+    os.register_at_fork(after_in_child=pipeline.restart_after_fork)
+    return pipeline
+
+
+LOG_PIPELINE = configure_logging()
 LOGGER = logging.getLogger("caddylander")
+ACCESS_LOGGER = logging.getLogger("caddylander.access")
+AUDIT_LOGGER = logging.getLogger("caddylander.audit")
 BUILD_VERSION = datetime.now().strftime("%y%m%d")
 
 
@@ -69,271 +229,3342 @@ def bootstrap_content() -> None:
         LOGGER.info("Bootstrapped runtime content from template")
 
 
-def read_body(request_handler: http.server.BaseHTTPRequestHandler) -> bytes:
-    length = int(request_handler.headers.get("Content-Length", "0"))
-    return request_handler.rfile.read(length)
+@contextmanager
+def file_lock(name: str, blocking: bool = True):
+    """Serialize writers of a shared file across threads and pre-forked workers.
 
+    With blocking=False the context yields False instead of waiting when the lock is held.
+    """
 
-class Handler(http.server.BaseHTTPRequestHandler):
-    def log_message(self, format, *args):
-        super().log_message(format, *args)
+    LOCK_DIR.mkdir(parents=True, exist_ok=True)
+    with open(LOCK_DIR / f"{name}.lock", "a") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
 
-    def do_GET(self):
-        parsed = urlparse(self.path)
-        if parsed.path == "/":
-            return self._serve_file(STATIC_DIR / "index.html", "text/html")
-        if parsed.path == "/admin":
-            if not self._require_auth():
-                return
-            return self._serve_file(STATIC_DIR / "admin.html", "text/html")
-        if parsed.path == "/api/admin/info":
-            if not self._require_auth():
-                return
-            return self._serve_admin_info()
-        if parsed.path == "/api/admin/content/generate":
-            if not self._require_auth():
-                return
-            return self._serve_generated_content()
-        if parsed.path == "/api/content":
-            return self._serve_file(RUNTIME_CONTENT, "application/json")
-        if parsed.path == "/admin/caddyfile":
-            if not self._require_auth():
-                return
-            return self._serve_caddyfile()
-        if parsed.path == "/api/admin/content/backups":
-            if not self._require_auth():
-                return
-            return self._serve_content_backups()
-        if parsed.path == "/api/admin/content/backup":
-            if not self._require_auth():
-                return
-            return self._serve_content_backup(parsed)
-        if parsed.path == "/api/admin/caddyfile/backups":
-            if not self._require_auth():
-                return
-            return self._serve_caddyfile_backups()
-        if parsed.path == "/api/admin/caddyfile/backup":
-            if not self._require_auth():
-                return
-            return self._serve_caddyfile_backup(parsed)
-        if parsed.path == "/api/admin/full-backup":
-            if not self._require_auth():
-                return
-            return self._serve_full_backup()
-        if parsed.path == "/favicon.png":
-            return self._serve_file(STATIC_DIR / "favicon.png", "image/png")
-        if parsed.path == "/favicon.svg":
-            return self._serve_favicon("favicon.svg", "image/svg+xml")
-        if parsed.path == "/favicon.ico":
-            return self._serve_favicon("favicon.ico", "image/x-icon")
-        if parsed.path == "/static/favicon.svg":
-            return self._serve_favicon("favicon.svg", "image/svg+xml")
-        if parsed.path == "/static/favicon.ico":
-            return self._serve_favicon("favicon.ico", "image/x-icon")
-        # Allow direct access to static assets without the /static prefix (e.g. /favicon.ico)
-        static_target = (STATIC_DIR / parsed.path.lstrip("/")).resolve()
-        if static_target.is_file() and static_target.is_relative_to(STATIC_DIR.resolve()):
-            return self._serve_file(static_target, self._guess_type(static_target))
-        if parsed.path.startswith("/static/"):
-            target = STATIC_DIR / parsed.path.removeprefix("/static/")
-            if target.is_file() and target.resolve().is_relative_to(STATIC_DIR.resolve()):
-                return self._serve_file(target, self._guess_type(target))
-        self.send_error(404)
 
-    def do_POST(self):
-        parsed = urlparse(self.path)
-        if parsed.path == "/api/upload":
-            if not self._require_auth():
-                return
-            return self._handle_content_upload()
-        if parsed.path == "/admin/caddyfile":
-            if not self._require_auth():
-                return
-            return self._handle_caddyfile_update()
-        if parsed.path == "/api/admin/content/restore":
-            if not self._require_auth():
-                return
-            return self._handle_content_restore()
-        if parsed.path == "/api/admin/favicon":
-            if not self._require_auth():
-                return
-            return self._handle_favicon_upload(parsed)
-        if parsed.path == "/api/admin/favicon/restore":
-            if not self._require_auth():
-                return
-            return self._handle_favicon_restore(parsed)
-        if parsed.path == "/api/admin/caddyfile/restore":
-            if not self._require_auth():
-                return
-            return self._handle_caddyfile_restore()
+class MetricsRegistry:
+    """Prometheus-style counters, gauges and histograms kept in per-thread shards.
 
-        self.send_error(404)
+    Recording only touches the calling thread's own shard, so the request path
+    never takes a lock; a scrape sums the shards. Shards of threads that have
+    exited are folded into one retired total whenever a new thread registers, so
+    the shard list tracks live threads whether or not anything scrapes.
+    Collectors add values that are cheaper to read at scrape time.
+    """
 
-    def _serve_file(self, path: Path, content_type: str):
-        if not path.exists():
-            self.send_error(404)
-            return
-        data = path.read_bytes()
-        self.send_response(200)
-        self.send_header("Content-Type", content_type)
-        self.send_header("Content-Length", str(len(data)))
-        self.end_headers()
-        self.wfile.write(data)
+    def __init__(self):
+        self._families: dict[str, tuple[str, str, tuple[float, ...]]] = {}
+        self._collectors = []
+        self._local = threading.local()
+        self._shards: list[tuple[threading.Thread, dict]] = []
+        self._retired: dict = {}
+        self._lock = threading.Lock()
 
-    def _guess_type(self, path: Path) -> str:
-        if path.suffix == ".html":
-            return "text/html"
-        if path.suffix == ".css":
-            return "text/css"
-        if path.suffix == ".js":
-            return "application/javascript"
-        if path.suffix == ".png":
-            return "image/png"
-        if path.suffix == ".svg":
-            return "image/svg+xml"
-        return "application/octet-stream"
+    def counter(self, name: str, help_text: str) -> None:
+        self._families[name] = ("counter", help_text, ())
 
-    def _serve_favicon(self, name: str, mime: str):
-        runtime_candidate = RUNTIME_STATIC / name
-        target = runtime_candidate if runtime_candidate.exists() else STATIC_DIR / name
-        return self._serve_file(target, mime)
+    def gauge(self, name: str, help_text: str) -> None:
+        self._families[name] = ("gauge", help_text, ())
 
-    def _require_auth(self) -> bool:
-        if not ADMIN_PASSWORD:
-            return True
+    def histogram(self, name: str, help_text: str, buckets: tuple[float, ...]) -> None:
+        self._families[name] = ("histogram", help_text, buckets)
 
-        header = self.headers.get("Authorization", "")
-        if header.startswith("Basic "):
+    def collector(self, collect) -> None:
+        """Register collect(totals) -> iterable of (name, labels, value), called on every scrape."""
+
+        self._collectors.append(collect)
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._retire_dead()
+                self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _retire_dead(self) -> None:
+        """Fold shards of exited threads into the retired total; caller holds the lock."""
+
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._merge(self._retired, shard)
+        self._shards = live
+
+    def inc(self, name: str, labels: tuple = (), amount: float = 1) -> None:
+        shard = self._shard()
+        key = (name, labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, labels: tuple = ()) -> None:
+        buckets = self._families[name][2]
+        shard = self._shard()
+        key = (name, labels)
+        sample = shard.get(key)
+        if sample is None:
+            # Per-bucket counts, then +Inf, then the running sum
+            sample = shard[key] = [0] * (len(buckets) + 2)
+        sample[bisect.bisect_left(buckets, value)] += 1
+        sample[-1] += value
+
+    @staticmethod
+    def _merge(into: dict, shard: dict) -> None:
+        for key, value in shard.items():
+            if isinstance(value, list):
+                current = into.get(key)
+                if current is None:
+                    into[key] = list(value)
+                else:
+                    for index, item in enumerate(value):
+                        current[index] += item
+            else:
+                into[key] = into.get(key, 0) + value
+
+    def totals(self) -> dict:
+        totals: dict = {}
+        with self._lock:
+            self._retire_dead()
+            self._merge(totals, self._retired)
+            for _, shard in self._shards:
+                self._merge(totals, shard.copy())
+        return totals
+
+    @staticmethod
+    def _labels(labels: tuple) -> str:
+        if not labels:
+            return ""
+        escaped = []
+        for key, value in labels:
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            escaped.append(f'{key}="{value}"')
+        return "{" + ",".join(escaped) + "}"
+
+    def render(self) -> bytes:
+        totals = self.totals()
+        for collect in self._collectors:
             try:
-                decoded = base64.b64decode(header.removeprefix("Basic ").strip()).decode()
-                username, password = decoded.split(":", 1)
+                for name, labels, value in collect(totals):
+                    totals[(name, labels)] = value
             except Exception:
-                username, password = None, None
+                LOGGER.exception("Metrics collector failed")
 
-            if password == ADMIN_PASSWORD:
-                return True
+        samples: dict[str, list] = {}
+        for (name, labels), value in totals.items():
+            samples.setdefault(name, []).append((labels, value))
 
-        self.send_response(401)
-        self.send_header("WWW-Authenticate", 'Basic realm="caddyLander"')
-        self.end_headers()
-        return False
+        lines = []
+        for name, (kind, help_text, buckets) in self._families.items():
+            if name not in samples:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in sorted(samples[name], key=lambda sample: sample[0]):
+                if kind != "histogram":
+                    lines.append(f"{name}{self._labels(labels)} {value:g}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, value):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{self._labels(labels + (('le', f'{bound:g}'),))} {cumulative}")
+                cumulative += value[len(buckets)]
+                lines.append(f"{name}_bucket{self._labels(labels + (('le', '+Inf'),))} {cumulative}")
+                lines.append(f"{name}_sum{self._labels(labels)} {value[-1]:g}")
+                lines.append(f"{name}_count{self._labels(labels)} {cumulative}")
+        return ("\n".join(lines) + "\n").encode("utf-8")
 
-    def _serve_admin_info(self):
-        info = {
-            "defaultPassword": ADMIN_PASSWORD == DEFAULT_ADMIN_PASSWORD,
-            "buildVersion": BUILD_VERSION,
-            "status": self._collect_status(),
-            "links": {
-                "github": "https://github.com/mythosaz/caddyLander"
-            },
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = tuple(float(2 ** power) for power in range(16, 31, 2))
+
+METRICS = MetricsRegistry()
+METRICS.counter("caddylander_http_requests_total", "HTTP requests by method, route and status")
+METRICS.histogram("caddylander_http_request_duration_seconds", "Time to handle a request, by route", LATENCY_BUCKETS)
+METRICS.counter("caddylander_http_request_body_bytes_total", "Request body bytes read, by route")
+METRICS.counter("caddylander_http_response_bytes_total", "Response bytes written including headers, by route")
+METRICS.gauge("caddylander_http_requests_in_flight", "Requests currently being handled")
+METRICS.gauge("caddylander_http_connections_open", "Client connections currently open")
+METRICS.gauge("caddylander_threads", "Live threads in this worker")
+METRICS.gauge("caddylander_event_streams_open", "Open Server-Sent Events streams")
+METRICS.histogram("caddylander_caddy_command_duration_seconds", "caddy subprocess run time, by command and exit code", SLOW_BUCKETS)
+METRICS.histogram("caddylander_backup_duration_seconds", "Backup write and prune time, by store", SLOW_BUCKETS)
+METRICS.histogram("caddylander_full_backup_duration_seconds", "Time to stream a full backup archive", SLOW_BUCKETS)
+METRICS.histogram("caddylander_full_backup_bytes", "Size of streamed full backup archives", SIZE_BUCKETS)
+METRICS.counter("caddylander_cache_requests_total", "Cache lookups by cache and result")
+METRICS.gauge("caddylander_cache_hit_ratio", "Share of cache lookups served from the cache since start")
+METRICS.gauge("caddylander_file_cache_bytes", "Bytes held by the file cache")
+
+CACHE_HIT = {name: (("cache", name), ("result", "hit")) for name in ("file", "landing", "caddyfile_parse")}
+CACHE_MISS = {name: (("cache", name), ("result", "miss")) for name in ("file", "landing", "caddyfile_parse")}
+
+
+def compress_payload(data: bytes, encoding: str, level: int | None = None) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if level is None else level)
+    return gzip.compress(data, compresslevel=9 if level is None else level, mtime=0)
+
+
+def precompress_variants(data: bytes) -> dict[str, bytes]:
+    """Build the encoded variants worth keeping for a cacheable payload."""
+
+    variants = {}
+    if len(data) < COMPRESS_MIN_BYTES:
+        return variants
+    for encoding in ("br", "gzip") if brotli is not None else ("gzip",):
+        encoded = compress_payload(data, encoding)
+        if len(encoded) < len(data):
+            variants[encoding] = encoded
+    return variants
+
+
+def negotiate_encoding(accept_encoding: str | None, available) -> str | None:
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[token] = quality
+
+    best = None
+    best_quality = 0.0
+    for encoding in ("br", "gzip"):
+        if encoding not in available:
+            continue
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class CachedFile:
+    __slots__ = ("data", "digest", "etag", "last_modified", "mtime", "mtime_ns", "size", "variants", "footprint")
+
+    def __init__(self, data: bytes, mtime_ns: int, size: int, compressible: bool = False):
+        self.data = data
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.mtime = mtime_ns // 1_000_000_000
+        self.digest = hashlib.sha256(data).hexdigest()[:32]
+        self.etag = f'"{self.digest}"'
+        self.last_modified = formatdate(self.mtime, usegmt=True)
+        self.variants = precompress_variants(data) if compressible else {}
+        self.footprint = len(data) + sum(len(v) for v in self.variants.values())
+
+    def variant_etag(self, encoding: str | None) -> str:
+        return f'"{self.digest}-{encoding}"' if encoding else self.etag
+
+
+class FileCache:
+    """Shared LRU cache of file bytes, invalidated by mtime/size or explicitly."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 4
+        self._entries: OrderedDict[Path, CachedFile] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, path: Path) -> CachedFile | None:
+        try:
+            stat = path.stat()
+        except OSError:
+            self.invalidate(path)
+            return None
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+                self._entries.move_to_end(path)
+                METRICS.inc("caddylander_cache_requests_total", CACHE_HIT["file"])
+                return entry
+
+        METRICS.inc("caddylander_cache_requests_total", CACHE_MISS["file"])
+        try:
+            data = path.read_bytes()
+        except OSError:
+            self.invalidate(path)
+            return None
+
+        if len(data) > self.max_entry_bytes:
+            self.invalidate(path)
+            return CachedFile(data, stat.st_mtime_ns, len(data))
+
+        compressible = path.suffix in COMPRESSIBLE_SUFFIXES or path.name == "Caddyfile"
+        entry = CachedFile(data, stat.st_mtime_ns, len(data), compressible)
+        with self._lock:
+            previous = self._entries.pop(path, None)
+            if previous is not None:
+                self._size -= previous.footprint
+            self._entries[path] = entry
+            self._size += entry.footprint
+            while self._size > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= evicted.footprint
+        return entry
+
+    def invalidate(self, path: Path) -> None:
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._size -= entry.footprint
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._size}
+
+
+def warm_static_cache() -> None:
+    for path in sorted(STATIC_DIR.rglob("*")):
+        if path.is_file():
+            FILE_CACHE.get(path)
+
+
+FILE_CACHE = FileCache(FILE_CACHE_MAX_BYTES)
+
+CONTENT_TYPES = {
+    ".html": "text/html",
+    ".css": "text/css",
+    ".js": "application/javascript",
+    ".json": "application/json",
+    ".png": "image/png",
+    ".svg": "image/svg+xml",
+    ".ico": "image/x-icon",
+}
+
+
+def guess_content_type(path: Path) -> str:
+    return CONTENT_TYPES.get(path.suffix, "application/octet-stream")
+
+
+class StaticIndex:
+    """In-memory map of servable static paths so lookups and 404s never touch the filesystem."""
+
+    def __init__(self):
+        self._entries: dict[str, tuple[Path, str]] = {}
+        self._runtime: frozenset[str] = frozenset()
+        self._lock = threading.Lock()
+
+    def lookup(self, url_path: str) -> tuple[Path, str] | None:
+        return self._entries.get(url_path)
+
+    def has_runtime(self, name: str) -> bool:
+        return name in self._runtime
+
+    def refresh(self) -> None:
+        entries = {}
+        static_root = STATIC_DIR.resolve()
+        if STATIC_DIR.is_dir():
+            for path in STATIC_DIR.rglob("*"):
+                if not path.is_file() or not path.resolve().is_relative_to(static_root):
+                    continue
+                rel = path.relative_to(STATIC_DIR).as_posix()
+                entry = (path, guess_content_type(path))
+                entries[f"/{rel}"] = entry
+                entries[f"/static/{rel}"] = entry
+
+        runtime = set()
+        if RUNTIME_STATIC.is_dir():
+            runtime = {path.name for path in RUNTIME_STATIC.iterdir() if path.is_file()}
+
+        with self._lock:
+            self._entries = entries
+            self._runtime = frozenset(runtime)
+
+    def watch(self, interval: float) -> None:
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.refresh()
+                except Exception:
+                    LOGGER.exception("Failed to refresh static index")
+
+        threading.Thread(target=loop, name="static-index", daemon=True).start()
+
+
+STATIC_INDEX = StaticIndex()
+
+
+def _render_landing_item(item: dict) -> str:
+    icon = f'<span class="icon">{html.escape(str(item["icon"]))}</span>' if item.get("icon") else ""
+    name = html.escape(str(item.get("name") or item.get("title") or "Unnamed"))
+    url = html.escape(str(item.get("url", "")), quote=True)
+    desc = f" — {html.escape(str(item['desc']))}" if item.get("desc") else ""
+    return f'<div class="item">{icon}<a href="{url}">{name}</a>{desc}</div>'
+
+
+def render_landing_html(template: str, content: dict) -> str:
+    """Inline content.json into index.html so the landing page needs no /api/content fetch."""
+
+    items = [item for item in content.get("items", []) if isinstance(item, dict)]
+    grouped: dict[str, list[dict]] = {}
+    ungrouped = []
+    for item in items:
+        if item.get("group"):
+            grouped.setdefault(str(item["group"]), []).append(item)
+        else:
+            ungrouped.append(item)
+
+    parts = [_render_landing_item(item) for item in ungrouped]
+    for group_name in sorted(grouped):
+        parts.append(f'<div class="group-header">{html.escape(group_name)}</div>')
+        parts.extend(_render_landing_item(item) for item in grouped[group_name])
+
+    inline_json = json.dumps(content, ensure_ascii=False).replace("<", "\\u003c")
+    head_extra = f'<script id="landing-data" type="application/json">{inline_json}</script>'
+    if content.get("favicon"):
+        head_extra += f'\n  <link rel="icon" href="{html.escape(str(content["favicon"]), quote=True)}">'
+
+    rendered = template.replace("</head>", f"  {head_extra}\n</head>", 1)
+    rendered = rendered.replace(
+        '<div id="content"></div>',
+        f'<div id="content" data-rendered="server">{"".join(parts)}</div>',
+        1,
+    )
+    if content.get("siteTitle"):
+        title = html.escape(str(content["siteTitle"]))
+        rendered = rendered.replace("<title>Landing</title>", f"<title>{title}</title>", 1)
+        rendered = rendered.replace(
+            '<h1 id="site-title">Services</h1>', f'<h1 id="site-title">{title}</h1>', 1
+        )
+    if content.get("siteSubtitle"):
+        rendered = rendered.replace(
+            '<div id="site-subtitle" class="subtitle"></div>',
+            f'<div id="site-subtitle" class="subtitle">{html.escape(str(content["siteSubtitle"]))}</div>',
+            1,
+        )
+    return rendered
+
+
+class LandingPageCache:
+    """Server-rendered index.html, rebuilt only when the template or content changes."""
+
+    def __init__(self):
+        self._key = None
+        self._entry: CachedFile | None = None
+        self._lock = threading.Lock()
+
+    def get(self) -> CachedFile | None:
+        template = FILE_CACHE.get(STATIC_DIR / "index.html")
+        content = FILE_CACHE.get(RUNTIME_CONTENT)
+        if template is None or content is None:
+            return template
+
+        key = (template.digest, content.digest)
+        with self._lock:
+            if self._key == key:
+                METRICS.inc("caddylander_cache_requests_total", CACHE_HIT["landing"])
+                return self._entry
+
+        METRICS.inc("caddylander_cache_requests_total", CACHE_MISS["landing"])
+        try:
+            parsed = json.loads(content.data.decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            LOGGER.warning("Runtime content is invalid JSON; serving client-rendered landing page")
+            return template
+        if not isinstance(parsed, dict):
+            return template
+
+        data = render_landing_html(template.data.decode("utf-8"), parsed).encode("utf-8")
+        entry = CachedFile(data, max(template.mtime_ns, content.mtime_ns), len(data), compressible=True)
+        with self._lock:
+            self._key = key
+            self._entry = entry
+        return entry
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._key = None
+            self._entry = None
+
+
+LANDING_CACHE = LandingPageCache()
+EXPORT_LOCK = threading.Lock()
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.tmp-{os.getpid()}-{threading.get_ident()}")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def render_export_snippet() -> str:
+    return "\n".join([
+        "# Generated by caddyLander. Import this inside your site block to serve the",
+        f"# landing page from {EXPORT_ROOT} and proxy only the admin UI and APIs.",
+        "(caddylander) {",
+        "\t@caddylander_dynamic path /admin /admin/* /api/* /static/*",
+        "\thandle @caddylander_dynamic {",
+        f"\t\treverse_proxy {EXPORT_UPSTREAM}",
+        "\t}",
+        "\thandle {",
+        f"\t\troot * {EXPORT_ROOT}",
+        '\t\theader /assets/* Cache-Control "public, max-age=31536000, immutable"',
+        '\t\theader / Cache-Control "no-cache"',
+        "\t\tfile_server {",
+        "\t\t\tprecompressed br gzip",
+        "\t\t}",
+        "\t}",
+        "}",
+        "",
+    ])
+
+
+def export_static_site() -> Path | None:
+    """Write a static, fingerprinted copy of the landing page for Caddy to serve directly."""
+
+    if not STATIC_EXPORT:
+        return None
+    with EXPORT_LOCK, file_lock("export"):
+        try:
+            return _export_static_site()
+        except Exception:
+            LOGGER.exception("Static site export failed")
+            return None
+
+
+def _export_static_site() -> Path:
+    content = json.loads(RUNTIME_CONTENT.read_text(encoding="utf-8"))
+    files: dict[str, bytes] = {}
+    assets: dict[str, str] = {}
+
+    for name in ("favicon.svg", "favicon.ico", "favicon.png"):
+        runtime_path = RUNTIME_STATIC / name
+        source = runtime_path if runtime_path.exists() else STATIC_DIR / name
+        if not source.exists():
+            continue
+        data = source.read_bytes()
+        stem, suffix = name.rsplit(".", 1)
+        fingerprinted = f"assets/{stem}.{hashlib.sha256(data).hexdigest()[:12]}.{suffix}"
+        files[fingerprinted] = data
+        files[name] = data
+        assets[name] = f"/{fingerprinted}"
+
+    favicon = content.get("favicon")
+    if isinstance(favicon, str):
+        favicon_name = favicon.rsplit("/", 1)[-1]
+        if favicon_name in assets and favicon in {f"/{favicon_name}", f"/static/{favicon_name}"}:
+            content = {**content, "favicon": assets[favicon_name]}
+
+    snapshot = json.dumps(content, ensure_ascii=False, indent=2).encode("utf-8")
+    snapshot_name = f"assets/content.{hashlib.sha256(snapshot).hexdigest()[:12]}.json"
+    files[snapshot_name] = snapshot
+    assets["content.json"] = f"/{snapshot_name}"
+
+    template = (STATIC_DIR / "index.html").read_text(encoding="utf-8")
+    files["index.html"] = render_landing_html(template, content).encode("utf-8")
+    files["manifest.json"] = json.dumps(assets, indent=2, sort_keys=True).encode("utf-8")
+
+    version_hash = hashlib.sha256()
+    for rel in sorted(files):
+        version_hash.update(rel.encode("utf-8"))
+        version_hash.update(hashlib.sha256(files[rel]).digest())
+    version = version_hash.hexdigest()[:12]
+
+    target = RUNTIME_BASE / f".site-{version}"
+    if not target.is_dir():
+        staging = RUNTIME_BASE / f".site-{version}.tmp-{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        for rel, data in files.items():
+            path = staging / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(data)
+            if path.suffix in COMPRESSIBLE_SUFFIXES:
+                for encoding, encoded in precompress_variants(data).items():
+                    suffix = ".br" if encoding == "br" else ".gz"
+                    path.with_name(path.name + suffix).write_bytes(encoded)
+        os.replace(staging, target)
+
+    if EXPORT_ROOT.is_dir() and not EXPORT_ROOT.is_symlink():
+        shutil.rmtree(EXPORT_ROOT)
+    link_tmp = RUNTIME_BASE / f".site-link.tmp-{os.getpid()}"
+    link_tmp.unlink(missing_ok=True)
+    link_tmp.symlink_to(target.name)
+    os.replace(link_tmp, EXPORT_ROOT)
+
+    # Keep the previous export around for requests that are still reading it.
+    exports = sorted(
+        (path for path in RUNTIME_BASE.glob(".site-*") if path.is_dir() and ".tmp-" not in path.name),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )
+    for old_export in [path for path in exports if path != target][1:]:
+        shutil.rmtree(old_export, ignore_errors=True)
+
+    snippet = render_export_snippet().encode("utf-8")
+    if not EXPORT_SNIPPET.exists() or EXPORT_SNIPPET.read_bytes() != snippet:
+        _write_atomic(EXPORT_SNIPPET, snippet)
+
+    LOGGER.info("Exported static landing page %s to %s", version, EXPORT_ROOT)
+    return target
+
+
+ASYNC_LOOP: asyncio.AbstractEventLoop | None = None
+
+
+class ValidationTicket:
+    """Cancellation handle for one in-flight validation and the caddy processes it started."""
+
+    def __init__(self):
+        self.cancelled = False
+        self._killers = []
+        self._lock = threading.Lock()
+
+    def register(self, kill) -> None:
+        with self._lock:
+            if not self.cancelled:
+                self._killers.append(kill)
+                return
+        kill()
+
+    def cancel(self) -> None:
+        with self._lock:
+            self.cancelled = True
+            killers, self._killers = self._killers, []
+        for kill in killers:
+            try:
+                kill()
+            except ProcessLookupError:
+                pass
+
+
+def _kill_quietly(process) -> None:
+    try:
+        process.kill()
+    except ProcessLookupError:
+        pass
+
+
+def _record_caddy_run(args: list[str], started: float, returncode: int) -> None:
+    labels = (("command", args[1] if len(args) > 1 else ""), ("exit_code", str(returncode)))
+    METRICS.observe("caddylander_caddy_command_duration_seconds", time.perf_counter() - started, labels)
+
+
+async def _run_caddy_async(args: list[str], ticket: ValidationTicket | None = None) -> subprocess.CompletedProcess:
+    started = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    if ticket is not None:
+        loop = asyncio.get_running_loop()
+        ticket.register(lambda: loop.call_soon_threadsafe(_kill_quietly, process))
+    stdout, stderr = await process.communicate()
+    _record_caddy_run(args, started, process.returncode)
+    return subprocess.CompletedProcess(
+        args,
+        process.returncode,
+        stdout.decode("utf-8", "replace"),
+        stderr.decode("utf-8", "replace"),
+    )
+
+
+def run_caddy(*args: str) -> subprocess.CompletedProcess:
+    """Run the vendored caddy binary, on the event loop when the asyncio engine is active."""
+
+    return run_caddy_many(list(args))[0]
+
+
+def run_caddy_many(*arg_lists: list[str], ticket: ValidationTicket | None = None) -> list[subprocess.CompletedProcess]:
+    """Run several caddy invocations concurrently and wait for all of them."""
+
+    commands = [[str(CADDY_BIN), *args] for args in arg_lists]
+    loop = ASYNC_LOOP
+    if loop is not None and loop.is_running():
+        async def gather():
+            return await asyncio.gather(*(_run_caddy_async(command, ticket) for command in commands))
+
+        return list(asyncio.run_coroutine_threadsafe(gather(), loop).result())
+
+    processes = []
+    started = time.perf_counter()
+    for command in commands:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        if ticket is not None:
+            ticket.register(lambda process=process: _kill_quietly(process))
+        processes.append(process)
+    results = []
+    for command, process in zip(commands, processes):
+        stdout, stderr = process.communicate()
+        _record_caddy_run(command, started, process.returncode)
+        results.append(subprocess.CompletedProcess(command, process.returncode, stdout, stderr))
+    return results
+
+
+class CaddyValidator:
+    """fmt + adapt pipeline with an LRU cache of results.
+
+    Results are keyed by the SHA-256 of the submitted text plus the path, mtime
+    and size of every file it imports, so editing an imported file invalidates
+    the verdict even though the Caddyfile itself did not change.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._results: OrderedDict[str, dict] = OrderedDict()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(VALIDATION_CONCURRENCY)
+        self._version: str | None = None
+        self.hits = 0
+        self.misses = 0
+        self.runs = 0
+        self.total_seconds = 0.0
+        self.last_seconds = 0.0
+
+    def version(self) -> str:
+        if self._version is None:
+            try:
+                result = run_caddy("version")
+                self._version = result.stdout.strip() or "unknown"
+            except OSError:
+                self._version = "unknown"
+        return self._version
+
+    def validate(self, text: str, ticket: ValidationTicket | None = None) -> dict:
+        return self._validate(text, hashlib.sha256(text.encode("utf-8")).hexdigest(), ticket)
+
+    def validate_upload(self, upload: Path, digest: str, ticket: ValidationTicket | None = None) -> dict:
+        """Validate a Caddyfile already spooled to disk, keyed by the digest computed while it streamed in."""
+
+        return self._validate(upload.read_text(encoding="utf-8"), digest, ticket)
+
+    def _validate(self, text: str, digest: str, ticket: ValidationTicket | None) -> dict:
+        # The text is validated as the Caddyfile it will replace, so imports resolve from there
+        base_dir = CADDYFILE_PATH.parent
+        ast = CADDYFILE_PARSES.parse(text)
+        imports, snippets = caddy_import_closure(ast, base_dir)
+        key = digest
+        if imports:
+            stamps = []
+            for path in imports:
+                try:
+                    stat = path.stat()
+                    stamps.append(f"{path}:{stat.st_mtime_ns}:{stat.st_size}")
+                except OSError:
+                    stamps.append(f"{path}:missing")
+            key += ":" + hashlib.sha256("\n".join(stamps).encode("utf-8")).hexdigest()
+
+        with self._lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return {**cached, "cached": True}
+            self.misses += 1
+
+        # Cap concurrent caddy processes across all clients; a superseded lint
+        # request gives up its place in line instead of waiting for a slot.
+        while not self._slots.acquire(timeout=0.05):
+            if ticket is not None and ticket.cancelled:
+                return {"success": False, "cancelled": True, "cached": False}
+        try:
+            if ticket is not None and ticket.cancelled:
+                return {"success": False, "cancelled": True, "cached": False}
+            started = time.perf_counter()
+            result = self._run(text, anchor_caddy_imports(text, ast, base_dir, snippets), ticket)
+            elapsed = time.perf_counter() - started
+        finally:
+            self._slots.release()
+        if ticket is not None and ticket.cancelled:
+            return {"success": False, "cancelled": True, "cached": False}
+        result["durationMs"] = round(elapsed * 1000, 1)
+
+        with self._lock:
+            self.runs += 1
+            self.total_seconds += elapsed
+            self.last_seconds = elapsed
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+        return {**result, "cached": False}
+
+    def _run(self, text: str, anchored: str, ticket: ValidationTicket | None = None) -> dict:
+        # fmt rewrites its file in place, so it gets its own copy; adapt runs on the
+        # original text at the same time since formatting does not change semantics.
+        # Only the adapt copy has its relative imports made absolute; fmt's output is what gets saved.
+        with tempfile.TemporaryDirectory(prefix="caddylander-validate-") as workdir:
+            fmt_path = Path(workdir) / "Caddyfile.fmt"
+            adapt_path = Path(workdir) / "Caddyfile"
+            fmt_path.write_bytes(text.encode("utf-8"))
+            adapt_path.write_bytes(anchored.encode("utf-8"))
+            fmt_result, adapt_result = run_caddy_many(
+                ["fmt", "--overwrite", str(fmt_path)],
+                ["adapt", "--adapter", "caddyfile", "--config", str(adapt_path)],
+                ticket=ticket,
+            )
+            formatted = fmt_path.read_text(encoding="utf-8", errors="replace") if fmt_result.returncode == 0 else None
+
+        # Report errors against "Caddyfile" rather than the throwaway temp paths.
+        for completed in (fmt_result, adapt_result):
+            completed.stderr = completed.stderr.replace(str(fmt_path), "Caddyfile").replace(str(adapt_path), "Caddyfile")
+
+        result = {
+            "success": False,
+            "formatted": formatted,
+            "adapted": None,
+            "caddyVersion": self.version(),
         }
-        data = json.dumps(info).encode()
-        self.send_response(200)
-        self.send_header("Content-Type", "application/json")
-        self.send_header("Content-Length", str(len(data)))
+        if fmt_result.returncode != 0:
+            return {**result, "stage": "fmt", "output": fmt_result.stderr}
+        if adapt_result.returncode != 0:
+            return {**result, "stage": "validate", "output": adapt_result.stderr}
+        return {**result, "success": True, "stage": "complete", "output": adapt_result.stderr, "adapted": adapt_result.stdout}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._results),
+                "runs": self.runs,
+                "lastMs": round(self.last_seconds * 1000, 1),
+                "avgMs": round(self.total_seconds / self.runs * 1000, 1) if self.runs else 0.0,
+            }
+
+
+CADDY_VALIDATOR = CaddyValidator(VALIDATION_CACHE_SIZE)
+
+DIAGNOSTIC_LOCATION = re.compile(r"Caddyfile:(\d+)(?::(\d+))?")
+
+
+def parse_caddy_diagnostics(output: str, stage: str) -> list[dict]:
+    diagnostics = []
+    for line in output.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        match = DIAGNOSTIC_LOCATION.search(line)
+        if match is None and diagnostics:
+            continue
+        message = line.removeprefix("Error: ")
+        if message.startswith("adapting config using caddyfile: "):
+            message = message.removeprefix("adapting config using caddyfile: ")
+        if match is not None:
+            message = message.replace(match.group(0), "", 1).lstrip(":- ").strip() or message
+        diagnostics.append({
+            "line": int(match.group(1)) if match else None,
+            "column": int(match.group(2)) if match and match.group(2) else None,
+            "severity": "error",
+            "stage": stage,
+            "message": message,
+        })
+    return diagnostics
+
+
+class LintSessions:
+    """Tracks each editor session's in-flight lint so a newer draft cancels the older one."""
+
+    def __init__(self):
+        self._tickets: dict[tuple, ValidationTicket] = {}
+        self._lock = threading.Lock()
+
+    def start(self, key: tuple) -> ValidationTicket:
+        ticket = ValidationTicket()
+        with self._lock:
+            previous = self._tickets.get(key)
+            self._tickets[key] = ticket
+        if previous is not None:
+            previous.cancel()
+        return ticket
+
+    def finish(self, key: tuple, ticket: ValidationTicket) -> None:
+        with self._lock:
+            if self._tickets.get(key) is ticket:
+                del self._tickets[key]
+
+
+LINT_SESSIONS = LintSessions()
+
+
+class CaddyToken:
+    __slots__ = ("text", "line", "column", "quoted")
+
+    def __init__(self, text: str, line: int, column: int, quoted: bool = False):
+        self.text = text
+        self.line = line
+        self.column = column
+        self.quoted = quoted
+
+    def is_brace(self, brace: str) -> bool:
+        return not self.quoted and self.text == brace
+
+
+class CaddyNode:
+    """One Caddyfile entry: a site, snippet or global options block, or a directive/matcher line."""
+
+    __slots__ = ("kind", "tokens", "children", "line", "end_line")
+
+    def __init__(self, kind: str, tokens: list[CaddyToken], line: int):
+        self.kind = kind
+        self.tokens = tokens
+        self.children: list[CaddyNode] | None = None
+        self.line = line
+        self.end_line = line
+
+    @property
+    def name(self) -> str:
+        return self.tokens[0].text if self.tokens else ""
+
+    @property
+    def args(self) -> list[str]:
+        return [token.text for token in self.tokens[1:]]
+
+    @property
+    def addresses(self) -> list[str]:
+        addresses = []
+        for token in self.tokens:
+            addresses.extend(part for part in token.text.split(",") if part)
+        return addresses
+
+    def walk(self):
+        yield self
+        for child in self.children or ():
+            yield from child.walk()
+
+
+class CaddyfileAST:
+    __slots__ = ("global_options", "snippets", "named_routes", "imports", "sites", "errors")
+
+    def __init__(self):
+        self.global_options: CaddyNode | None = None
+        self.snippets: dict[str, CaddyNode] = {}
+        self.named_routes: dict[str, CaddyNode] = {}
+        self.imports: list[CaddyNode] = []
+        self.sites: list[CaddyNode] = []
+        self.errors: list[dict] = []
+
+    def error(self, line: int, message: str) -> None:
+        self.errors.append({"line": line, "message": message})
+
+
+CADDY_LEXEME = re.compile(
+    r'(?P<newline>\n)'
+    r'|(?P<space>[^\S\n]+)'
+    r'|(?P<comment>#[^\n]*)'
+    r'|(?P<heredoc><<(?P<marker>[A-Za-z0-9_-]+)[ \t]*(?=\n))'
+    r'|(?P<quoted>"(?:[^"\\]|\\[\s\S])*")'
+    r'|(?P<backtick>`[^`]*`)'
+    r'|(?P<word>\S+)'
+)
+CADDY_ESCAPE = re.compile(r'\\(["\\])')
+
+
+def tokenize_caddyfile(text: str) -> tuple[list[list[CaddyToken]], list[dict]]:
+    """Split a Caddyfile into logical lines of tokens, following caddy's lexer rules."""
+
+    lines: list[list[CaddyToken]] = []
+    errors: list[dict] = []
+    current: list[CaddyToken] = []
+    line, line_start, pos = 1, 0, 0
+
+    while pos < len(text):
+        match = CADDY_LEXEME.match(text, pos)
+        kind = match.lastgroup
+        column = pos - line_start + 1
+        end = match.end()
+
+        if kind == "newline":
+            if current:
+                lines.append(current)
+                current = []
+            line, line_start = line + 1, end
+        elif kind in ("space", "comment"):
+            pass
+        elif kind == "heredoc":
+            marker = match.group("marker")
+            closing = re.compile(rf"^([ \t]*){re.escape(marker)}(?=[ \t\r]|$)", re.MULTILINE).search(text, end + 1)
+            if closing is None:
+                errors.append({"line": line, "message": f"heredoc marker {marker} is never closed"})
+                current.append(CaddyToken(match.group(0), line, column))
+            else:
+                indent = closing.group(1)
+                body = text[end + 1:closing.start()].removesuffix("\n")
+                body = "\n".join(part.removeprefix(indent) for part in body.split("\n"))
+                current.append(CaddyToken(body, line, column, quoted=True))
+                line += text.count("\n", end, closing.end())
+                line_start = text.rfind("\n", 0, closing.end()) + 1
+                end = closing.end()
+        elif kind in ("quoted", "backtick"):
+            raw = match.group(0)
+            value = CADDY_ESCAPE.sub(r"\1", raw[1:-1]) if kind == "quoted" else raw[1:-1]
+            current.append(CaddyToken(value, line, column, quoted=True))
+            newlines = raw.count("\n")
+            if newlines:
+                line += newlines
+                line_start = pos + raw.rfind("\n") + 1
+        else:
+            current.append(CaddyToken(match.group(0), line, column))
+        pos = end
+
+    if current:
+        lines.append(current)
+    return lines, errors
+
+
+def _parse_caddy_block(lines: list[list[CaddyToken]], index: int, ast: CaddyfileAST, opener: CaddyNode) -> int:
+    """Parse directive lines into opener.children until the matching close brace."""
+
+    opener.children = []
+    stack = [opener]
+    while index < len(lines):
+        tokens = lines[index]
+        index += 1
+        if tokens[0].is_brace("}"):
+            closed = stack.pop()
+            closed.end_line = tokens[0].line
+            if len(tokens) > 1:
+                ast.error(tokens[1].line, f"unexpected '{tokens[1].text}' after closing brace")
+            if not stack:
+                return index
+            continue
+
+        opens = tokens[-1].is_brace("{")
+        body = tokens[:-1] if opens else tokens
+        if not body:
+            ast.error(tokens[0].line, "unexpected '{' without a directive")
+            body = tokens
+        node = CaddyNode("matcher" if body[0].text.startswith("@") else "directive", body, tokens[0].line)
+        stack[-1].children.append(node)
+        if opens:
+            node.children = []
+            stack.append(node)
+
+    ast.error(stack[-1].line, f"'{stack[-1].name or '{'}' block is never closed")
+    return index
+
+
+def parse_caddyfile(text: str) -> CaddyfileAST:
+    """Parse a Caddyfile into its global options, snippets and site blocks."""
+
+    lines, errors = tokenize_caddyfile(text)
+    ast = CaddyfileAST()
+    ast.errors.extend(errors)
+    index = 0
+
+    while index < len(lines):
+        first_line = lines[index][0].line
+        keys = list(lines[index])
+        index += 1
+        # Address lists may continue onto the next line after a trailing comma
+        while index < len(lines) and keys[-1].text.endswith(",") and not keys[-1].quoted:
+            keys.extend(lines[index])
+            index += 1
+
+        if keys[0].is_brace("}"):
+            ast.error(first_line, "unexpected '}'")
+            continue
+
+        if keys[0].text == "import" and not keys[0].quoted:
+            ast.imports.append(CaddyNode("import", keys, first_line))
+            continue
+
+        if not keys[-1].is_brace("{"):
+            if not ast.sites and not ast.snippets and not ast.imports and ast.global_options is None:
+                # A lone site may omit braces; everything after the address is its body
+                node = CaddyNode("site", keys, first_line)
+                node.children = [
+                    CaddyNode("matcher" if line[0].text.startswith("@") else "directive", line, line[0].line)
+                    for line in lines[index:]
+                ]
+                node.end_line = lines[-1][0].line
+                ast.sites.append(node)
+                break
+            ast.error(first_line, f"expected '{{' after {keys[0].text}")
+            continue
+
+        keys = keys[:-1]
+        if not keys:
+            node = CaddyNode("global", keys, first_line)
+            if ast.sites or ast.snippets or ast.global_options is not None:
+                ast.error(first_line, "global options must be the first block")
+            else:
+                ast.global_options = node
+        elif len(keys) == 1 and keys[0].text.startswith("(") and keys[0].text.endswith(")"):
+            node = CaddyNode("snippet", keys, first_line)
+            ast.snippets[keys[0].text[1:-1]] = node
+        elif len(keys) == 1 and keys[0].text.startswith("&(") and keys[0].text.endswith(")"):
+            node = CaddyNode("named_route", keys, first_line)
+            ast.named_routes[keys[0].text[2:-1]] = node
+        else:
+            node = CaddyNode("site", keys, first_line)
+            ast.sites.append(node)
+        index = _parse_caddy_block(lines, index, ast, node)
+
+    return ast
+
+
+class CaddyfileParseCache:
+    """Memoizes parse_caddyfile by content hash so every consumer shares one parse."""
+
+    def __init__(self, max_entries: int, max_files: int = 512):
+        self.max_entries = max_entries
+        self.max_files = max_files
+        self._entries: OrderedDict[str, CaddyfileAST] = OrderedDict()
+        self._files: OrderedDict[Path, tuple[int, int, CaddyfileAST]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def parse_file(self, path: Path) -> CaddyfileAST | None:
+        """Parse a file on disk, re-reading it only when its mtime or size changes."""
+
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._files.get(path)
+            if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+                self._files.move_to_end(path)
+                METRICS.inc("caddylander_cache_requests_total", CACHE_HIT["caddyfile_parse"])
+                return cached[2]
+
+        try:
+            text = path.read_text(encoding="utf-8")
+        except (OSError, UnicodeDecodeError):
+            return None
+        ast = self.parse(text)
+        with self._lock:
+            self._files[path] = (stat.st_mtime_ns, stat.st_size, ast)
+            self._files.move_to_end(path)
+            while len(self._files) > self.max_files:
+                self._files.popitem(last=False)
+        return ast
+
+    def parse(self, text: str) -> CaddyfileAST:
+        key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        with self._lock:
+            ast = self._entries.get(key)
+            if ast is not None:
+                self._entries.move_to_end(key)
+                METRICS.inc("caddylander_cache_requests_total", CACHE_HIT["caddyfile_parse"])
+                return ast
+
+        METRICS.inc("caddylander_cache_requests_total", CACHE_MISS["caddyfile_parse"])
+        ast = parse_caddyfile(text)
+        with self._lock:
+            self._entries[key] = ast
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return ast
+
+
+CADDYFILE_PARSES = CaddyfileParseCache(8)
+
+
+def expand_caddy_sites(
+    ast: CaddyfileAST,
+    base_dir: Path,
+    snippets: dict[str, CaddyNode] | None = None,
+    chain: tuple[Path, ...] = (),
+    errors: list[str] | None = None,
+) -> tuple[list[CaddyNode], list[str]]:
+    """Collect site blocks from a parsed Caddyfile, following top-level imports and snippets."""
+
+    snippets = {} if snippets is None else snippets
+    errors = [] if errors is None else errors
+    snippets.update(ast.snippets)
+    sites = []
+
+    # Walk sites and imports in document order so imported hosts keep their place
+    for node in sorted(ast.sites + ast.imports, key=lambda node: node.line):
+        if node.kind == "site":
+            sites.append(node)
+            continue
+        if not node.args:
+            continue
+        target = node.args[0]
+        if target in snippets:
+            # Site blocks defined inside a snippet parse as directive lines with a block
+            sites.extend(child for child in snippets[target].children or () if child.children is not None)
+            continue
+
+        for match in _caddy_import_matches(target, base_dir):
+            path = Path(match).resolve()
+            if path in chain:
+                errors.append(f"import cycle: {' -> '.join(str(p) for p in (*chain, path))}")
+                continue
+            imported = CADDYFILE_PARSES.parse_file(path)
+            if imported is None:
+                errors.append(f"cannot import {match} (line {node.line})")
+                continue
+            imported_sites, _ = expand_caddy_sites(imported, path.parent, snippets, (*chain, path), errors)
+            sites.extend(imported_sites)
+
+    return sites, errors
+
+
+def _caddy_import_matches(target: str, base_dir: Path) -> list[str]:
+    # caddy resolves a relative import against the directory of the file that contains it
+    pattern = Path(target) if Path(target).is_absolute() else base_dir / target
+    return sorted(glob.glob(str(pattern))) if glob.has_magic(str(pattern)) else [str(pattern)]
+
+
+def _caddy_import_nodes(ast: CaddyfileAST):
+    """Every import line in the file: top-level ones and those inside sites, snippets and routes."""
+
+    roots = [ast.global_options, *ast.snippets.values(), *ast.named_routes.values(), *ast.sites, *ast.imports]
+    for root in roots:
+        if root is None:
+            continue
+        for node in root.walk():
+            if node.name == "import" and len(node.tokens) > 1 and not node.tokens[0].quoted:
+                yield node
+
+
+def caddy_import_closure(ast: CaddyfileAST, base_dir: Path) -> tuple[list[Path], set[str]]:
+    """Files a Caddyfile imports, directly or through other imports, and every snippet name they define.
+
+    Targets that name a snippet, or that use placeholders, are not files and are skipped.
+    """
+
+    files: list[Path] = []
+    snippets: set[str] = set()
+    pending = [(ast, base_dir)]
+    while pending:
+        current, directory = pending.pop()
+        snippets.update(current.snippets)
+        for node in _caddy_import_nodes(current):
+            target = node.tokens[1].text
+            if target in snippets or "{" in target:
+                continue
+            for match in _caddy_import_matches(target, directory):
+                path = Path(match).resolve()
+                if path in files:
+                    continue
+                files.append(path)
+                imported = CADDYFILE_PARSES.parse_file(path)
+                if imported is not None:
+                    pending.append((imported, path.parent))
+    return files, snippets
+
+
+def anchor_caddy_imports(text: str, ast: CaddyfileAST, base_dir: Path, snippets: set[str]) -> str:
+    """Rewrite relative file imports in text as absolute paths under base_dir.
+
+    The validator runs caddy on a copy in a temporary directory; without this,
+    relative imports in the copy would resolve against that directory instead
+    of the one the Caddyfile is saved to.
+    """
+
+    targets = []
+    for node in _caddy_import_nodes(ast):
+        token = node.tokens[1]
+        if token.text in snippets or "{" in token.text or Path(token.text).is_absolute():
+            continue
+        targets.append(token)
+    if not targets:
+        return text
+
+    lines = text.split("\n")
+    for token in sorted(targets, key=lambda token: (token.line, token.column), reverse=True):
+        line = lines[token.line - 1]
+        start = token.column - 1
+        match = CADDY_LEXEME.match(line, start)
+        if match is None:
+            continue
+        anchored = str(base_dir / token.text).replace('"', '\\"')
+        lines[token.line - 1] = f'{line[:start]}"{anchored}"{line[match.end():]}'
+    return "\n".join(lines)
+
+
+DISCOVERED_SOURCE = "caddyfile"
+
+
+def normalize_item_url(url: str) -> str:
+    """Key a dashboard URL by host, non-default port and path, ignoring scheme and case."""
+
+    parsed = urlparse(url.strip() if "://" in url else f"https://{url.strip()}")
+    try:
+        port = parsed.port
+    except ValueError:
+        port = None
+    host = (parsed.hostname or "").lower()
+    netloc = host if port in (None, 80, 443) else f"{host}:{port}"
+    return f"{netloc}{parsed.path.rstrip('/')}"
+
+
+class ContentUrlIndex:
+    """content.json item positions by normalized URL, rebuilt only when the file changes.
+
+    Alongside the full index it keeps the subset that points at discovered
+    items, which is all a sync has to revisit. Both are read-only for callers.
+    """
+
+    def __init__(self):
+        self._digest = None
+        self._index: dict[str, int] = {}
+        self._discovered: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, entry: CachedFile, items: list) -> tuple[dict[str, int], dict[str, int]]:
+        with self._lock:
+            if self._digest == entry.digest:
+                return self._index, self._discovered
+
+        index = {}
+        for position, item in enumerate(items):
+            if isinstance(item, dict) and item.get("url"):
+                index.setdefault(normalize_item_url(str(item["url"])), position)
+        discovered = {key: position for key, position in index.items() if items[position].get("source") == DISCOVERED_SOURCE}
+        self.put(entry, index, discovered)
+        return index, discovered
+
+    def put(self, entry: CachedFile, index: dict[str, int], discovered: dict[str, int]) -> None:
+        with self._lock:
+            self._digest = entry.digest
+            self._index = index
+            self._discovered = discovered
+
+
+CONTENT_URL_INDEX = ContentUrlIndex()
+
+
+class ContentDocumentCache:
+    """Parsed content.json for the current file digest; callers must treat it as read-only."""
+
+    def __init__(self):
+        self._digest = None
+        self._document = None
+        self._lock = threading.Lock()
+
+    def get(self, entry: CachedFile):
+        with self._lock:
+            if self._digest == entry.digest:
+                return self._document
+        document = json.loads(entry.data.decode("utf-8"))
+        self.put(entry, document)
+        return document
+
+    def put(self, entry: CachedFile, document) -> None:
+        with self._lock:
+            self._digest = entry.digest
+            self._document = document
+
+
+CONTENT_DOCUMENT = ContentDocumentCache()
+
+
+def diff_discovered_hosts(
+    items: list, index: dict[str, int], discovered_at: dict[str, int], hosts: list[tuple[str, str]]
+) -> dict:
+    """Merge discovered hosts into items and return what changed.
+
+    New hosts are appended, discovered items that disappeared are flagged stale
+    and come back unflagged; every other field is left as curated. Only the
+    positions in discovered_at are visited, and a changed item is replaced by a
+    copy, so items may be a shallow copy of the cached document.
+    """
+
+    discovered = {normalize_item_url(url): (display, url) for display, url in hosts}
+    changes = {"added": [], "stale": [], "restored": []}
+
+    for key, (display, url) in discovered.items():
+        if key in index:
+            continue
+        items.append({"name": display, "url": url, "desc": "Discovered from Caddyfile", "source": DISCOVERED_SOURCE})
+        changes["added"].append({"name": display, "url": url})
+
+    for key, position in discovered_at.items():
+        item = items[position]
+        if key in discovered and item.get("stale"):
+            items[position] = {field: value for field, value in item.items() if field != "stale"}
+            changes["restored"].append({"name": item.get("name"), "url": item["url"]})
+        elif key not in discovered and not item.get("stale"):
+            items[position] = {**item, "stale": True}
+            changes["stale"].append({"name": item.get("name"), "url": item["url"]})
+    return changes
+
+
+class JsonPatchError(ValueError):
+    def __init__(self, message: str, status: int = 422):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_pointer(pointer: str) -> list[str]:
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JsonPatchError(f"invalid JSON pointer {pointer!r}")
+    return [part.replace("~1", "/").replace("~0", "~") for part in pointer[1:].split("/")]
+
+
+def _json_equal(a, b) -> bool:
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return a == b
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_json_equal(a[key], b[key]) for key in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(_json_equal(x, y) for x, y in zip(a, b))
+    return type(a) is type(b) and a == b
+
+
+def _list_index(container: list, token: str, pointer: str, append: bool = False) -> int:
+    if append and token == "-":
+        return len(container)
+    if not token.isdigit() or (token != "0" and token.startswith("0")):
+        raise JsonPatchError(f"invalid array index in {pointer!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not append):
+        raise JsonPatchError(f"array index out of range in {pointer!r}", 409)
+    return index
+
+
+def _json_get(document, tokens: list[str], pointer: str):
+    for token in tokens:
+        if isinstance(document, dict):
+            if token not in document:
+                raise JsonPatchError(f"path {pointer!r} does not exist", 409)
+            document = document[token]
+        elif isinstance(document, list):
+            document = document[_list_index(document, token, pointer)]
+        else:
+            raise JsonPatchError(f"path {pointer!r} does not exist", 409)
+    return document
+
+
+def _json_update(document, tokens: list[str], pointer: str, change):
+    """Return a copy of document with change applied to the parent of tokens.
+
+    Only the containers along the path are copied, so untouched parts of a large
+    document are shared with the original rather than duplicated.
+    """
+
+    if len(tokens) == 1:
+        if not isinstance(document, (dict, list)):
+            raise JsonPatchError(f"path {pointer!r} does not exist", 409)
+        parent = document.copy()
+        change(parent, tokens[0])
+        return parent
+    head = tokens[0]
+    child = _json_get(document, [head], pointer)
+    updated = document.copy()
+    key = head if isinstance(document, dict) else _list_index(document, head, pointer)
+    updated[key] = _json_update(child, tokens[1:], pointer, change)
+    return updated
+
+
+def _json_add(document, pointer: str, value):
+    tokens = _json_pointer(pointer)
+    if not tokens:
+        return value
+
+    def change(parent, token):
+        if isinstance(parent, dict):
+            parent[token] = value
+        else:
+            parent.insert(_list_index(parent, token, pointer, append=True), value)
+
+    return _json_update(document, tokens, pointer, change)
+
+
+def _json_remove(document, pointer: str):
+    tokens = _json_pointer(pointer)
+    if not tokens:
+        raise JsonPatchError("cannot remove the whole document")
+
+    def change(parent, token):
+        if isinstance(parent, dict):
+            if token not in parent:
+                raise JsonPatchError(f"path {pointer!r} does not exist", 409)
+            del parent[token]
+        else:
+            del parent[_list_index(parent, token, pointer)]
+
+    return _json_update(document, tokens, pointer, change)
+
+
+def _json_replace(document, pointer: str, value):
+    tokens = _json_pointer(pointer)
+    if not tokens:
+        return value
+
+    def change(parent, token):
+        # Assign in place so an object keeps its key order, as RFC 6902 replace does
+        if isinstance(parent, dict):
+            if token not in parent:
+                raise JsonPatchError(f"path {pointer!r} does not exist", 409)
+            parent[token] = value
+        else:
+            parent[_list_index(parent, token, pointer)] = value
+
+    return _json_update(document, tokens, pointer, change)
+
+
+def apply_json_patch(document, operations: list):
+    """Apply an RFC 6902 JSON Patch, returning a new document and leaving the input untouched."""
+
+    if not isinstance(operations, list):
+        raise JsonPatchError("a JSON Patch must be an array of operations")
+    for number, operation in enumerate(operations):
+        if not isinstance(operation, dict) or not isinstance(operation.get("path"), str):
+            raise JsonPatchError(f"operation {number} needs a string 'path'")
+        op, path = operation.get("op"), operation["path"]
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise JsonPatchError(f"operation {number} ({op}) needs a 'value'")
+        if op in ("move", "copy") and not isinstance(operation.get("from"), str):
+            raise JsonPatchError(f"operation {number} ({op}) needs a string 'from'")
+
+        if op == "add":
+            document = _json_add(document, path, operation["value"])
+        elif op == "remove":
+            document = _json_remove(document, path)
+        elif op == "replace":
+            document = _json_replace(document, path, operation["value"])
+        elif op == "move":
+            source = operation["from"]
+            if path != source and path.startswith(source + "/"):
+                raise JsonPatchError(f"operation {number} moves {source!r} into itself")
+            value = _json_get(document, _json_pointer(source), source)
+            document = _json_add(_json_remove(document, source), path, value)
+        elif op == "copy":
+            source = operation["from"]
+            document = _json_add(document, path, _json_get(document, _json_pointer(source), source))
+        elif op == "test":
+            if not _json_equal(_json_get(document, _json_pointer(path), path), operation["value"]):
+                raise JsonPatchError(f"test failed at {path!r}", 409)
+        else:
+            raise JsonPatchError(f"operation {number} has unknown op {op!r}")
+    return document
+
+
+def serialize_content(document) -> bytes:
+    return json.dumps(document, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def replay_content_patch(base: bytes, operations: list) -> bytes:
+    return serialize_content(apply_json_patch(json.loads(base.decode("utf-8")), operations))
+
+
+class BackupStore:
+    """Content-addressed backup history: gzip blobs keyed by SHA-256 plus an append-only JSONL index.
+
+    Saves made by a patch record the patch on the entry for the state they
+    replaced; the next backup (the patched state) then needs no blob of its own
+    and is rebuilt by replaying the patch, up to BACKUP_PATCH_CHAIN steps deep.
+    """
+
+    def __init__(self, root: Path, prefix: str, replay=None):
+        self.root = root
+        self.prefix = prefix
+        self.replay = replay
+        self.objects_dir = root / "objects"
+        self.index_path = root / "index.jsonl"
+        self._entries: list[dict] = []
+        self._links: dict[str, dict] = {}
+        self._index_stat = None
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+        store = prefix.removesuffix(".old.")
+        self._write_labels = (("store", store), ("operation", "write"))
+        self._prune_labels = (("store", store), ("operation", "prune"))
+
+    def _object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / f"{digest[2:]}.gz"
+
+    def _store_blob(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        if not path.exists():
+            _write_atomic(path, gzip.compress(data, compresslevel=9, mtime=0))
+        return digest
+
+    def _sync(self, max_age: float = 0.0) -> None:
+        """Reload the index if another worker appended to it since we last read it."""
+
+        now = time.monotonic()
+        if max_age and now - self._checked_at < max_age:
+            return
+        self._checked_at = now
+        try:
+            stat = self.index_path.stat()
+            signature = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            signature = None
+        if signature == self._index_stat:
+            return
+
+        entries = []
+        if signature is not None:
+            for line in self.index_path.read_text(encoding="utf-8").splitlines():
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    LOGGER.warning("Skipping corrupt backup index line in %s", self.index_path)
+        self._entries = entries
+        self._index_stat = signature
+        self._relink()
+
+    def _relink(self) -> None:
+        self._links = {}
+        for entry in self._entries:
+            if "patched" in entry:
+                self._links.setdefault(entry["patched"], entry)
+
+    def migrate_legacy(self) -> None:
+        """Import plain timestamped backup files written by older releases."""
+
+        with self._lock:
+            self._sync()
+            legacy = sorted(
+                (path for path in self.root.glob(f"{self.prefix}*") if path.is_file()),
+                key=lambda p: p.stat().st_mtime,
+            )
+            for path in legacy:
+                data = path.read_bytes()
+                self._append({
+                    "name": path.name,
+                    "timestamp": path.stat().st_mtime,
+                    "hash": self._store_blob(data),
+                    "size": len(data),
+                    "source": "legacy",
+                })
+                path.unlink(missing_ok=True)
+        if legacy:
+            LOGGER.info("Imported %s legacy backups into %s", len(legacy), self.root)
+
+    def _append(self, entry: dict) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, sort_keys=True) + "\n")
+        self._entries.append(entry)
+        if "patched" in entry:
+            self._links.setdefault(entry["patched"], entry)
+        stat = self.index_path.stat()
+        self._index_stat = (stat.st_mtime_ns, stat.st_size)
+
+    def _compact(self) -> None:
+        started = time.perf_counter()
+        kept = self._entries[-BACKUP_KEEP:]
+        links: dict[str, dict] = {}
+        for entry in kept:
+            if "patched" in entry:
+                links.setdefault(entry["patched"], entry)
+        # A patch chain that starts in the dropped prefix loses its base; give its oldest
+        # kept state a blob and let the later states replay from that one.
+        readable: set[str] = set()
+        for entry in kept:
+            digest = entry["hash"]
+            link = links.get(digest)
+            if self._object_path(digest).exists():
+                entry.pop("depth", None)
+            elif link is not None and link["hash"] in readable:
+                entry["depth"] = link.get("depth", 0) + 1
+            elif digest not in readable:
+                data = self.read_entry(entry)
+                if data is None:
+                    continue
+                self._store_blob(data)
+                entry.pop("depth", None)
+            readable.add(digest)
+        data = "".join(json.dumps(entry, sort_keys=True) + "\n" for entry in kept).encode("utf-8")
+        _write_atomic(self.index_path, data)
+        self._entries = kept
+        self._relink()
+        stat = self.index_path.stat()
+        self._index_stat = (stat.st_mtime_ns, stat.st_size)
+
+        referenced = {entry["hash"] for entry in kept}
+        for blob in self.objects_dir.glob("*/*.gz"):
+            if blob.parent.name + blob.name.removesuffix(".gz") not in referenced:
+                blob.unlink(missing_ok=True)
+        METRICS.observe("caddylander_backup_duration_seconds", time.perf_counter() - started, self._prune_labels)
+
+    def add(self, data: bytes, source: str, patch: list | None = None, patched: str | None = None) -> dict | None:
+        """Record data as a backup; patch/patched describe the save that replaced it, if it was a patch."""
+
+        started = time.perf_counter()
+        with self._lock:
+            self._sync()
+            digest = hashlib.sha256(data).hexdigest()
+            if patch is None and self._entries and self._entries[-1]["hash"] == digest:
+                return None
+
+            link = self._links.get(digest)
+            depth = link.get("depth", 0) + 1 if link is not None and self.replay is not None else None
+            if depth is None or depth > BACKUP_PATCH_CHAIN or self._object_path(digest).exists():
+                self._store_blob(data)
+                depth = 0
+
+            now = time.time()
+            stamp = datetime.fromtimestamp(now).strftime("%Y%m%d-%H%M%S")
+            base_name = f"{self.prefix}{stamp}.{digest[:12]}"
+            taken = {entry["name"] for entry in self._entries}
+            name, suffix = base_name, 1
+            while name in taken:
+                suffix += 1
+                name = f"{base_name}.{suffix}"
+            entry = {
+                "name": name,
+                "timestamp": now,
+                "hash": digest,
+                "size": len(data),
+                "source": source,
+            }
+            if depth:
+                entry["depth"] = depth
+            if patch is not None:
+                entry["patch"] = patch
+                entry["patched"] = patched
+            self._append(entry)
+            METRICS.observe("caddylander_backup_duration_seconds", time.perf_counter() - started, self._write_labels)
+            # Compaction rewrites the index, so only do it once the slack is used up.
+            if len(self._entries) > BACKUP_KEEP + max(10, BACKUP_KEEP // 10):
+                self._compact()
+            return entry
+
+    def entries(self) -> list[dict]:
+        """Retained backups, newest first."""
+
+        with self._lock:
+            self._sync(BACKUP_INDEX_RECHECK)
+            return list(reversed(self._entries[-BACKUP_KEEP:]))
+
+    def page(self, offset: int = 0, limit: int | None = None, since: float | None = None) -> dict:
+        entries = self.entries()
+        if since is not None:
+            entries = [entry for entry in entries if entry["timestamp"] > since]
+        end = len(entries) if limit is None else offset + limit
+        return {
+            "backups": entries[offset:end],
+            "total": len(entries),
+            "nextOffset": end if end < len(entries) else None,
+        }
+
+    def reconcile(self) -> dict:
+        """Bring the index back in line with what is actually on disk."""
+
+        with self._lock:
+            self._sync()
+            present = {
+                blob.parent.name + blob.name.removesuffix(".gz")
+                for blob in self.objects_dir.glob("*/*.gz")
+            }
+            if all(entry["hash"] in present for entry in self._entries):
+                kept = self._entries
+            else:
+                kept = [entry for entry, data in self.read_all(self._entries) if data is not None]
+            missing = len(self._entries) - len(kept)
+            if missing:
+                self._entries = kept
+                self._compact()
+
+            referenced = {entry["hash"] for entry in self._entries}
+            orphans = len(present - referenced)
+            if orphans:
+                self._compact()
+
+            legacy_before = len(self._entries)
+            self.migrate_legacy()
+            result = {
+                "missing": missing,
+                "orphans": orphans,
+                "imported": len(self._entries) - legacy_before,
+                # What the listing shows; entries past BACKUP_KEEP only await compaction
+                "total": min(len(self._entries), BACKUP_KEEP),
+            }
+        LOGGER.info("Reconciled backup index %s: %s", self.root, result)
+        return result
+
+    def find(self, name: str) -> dict | None:
+        for entry in self.entries():
+            if entry["name"] == name:
+                return entry
+        return None
+
+    def read(self, name: str) -> bytes | None:
+        entry = self.find(name)
+        return None if entry is None else self.read_entry(entry)
+
+    def read_entry(self, entry: dict) -> bytes | None:
+        data = self._read_hash(entry["hash"], BACKUP_PATCH_CHAIN + 1)
+        if data is None:
+            LOGGER.warning("Backup %s is missing its blob %s", entry["name"], entry["hash"])
+        return data
+
+    def _read_hash(self, digest: str, budget: int) -> bytes | None:
+        try:
+            return gzip.decompress(self._object_path(digest).read_bytes())
+        except FileNotFoundError:
+            pass
+        link = self._links.get(digest)
+        if link is None or self.replay is None or budget <= 0:
+            return None
+        base = self._read_hash(link["hash"], budget - 1)
+        if base is None:
+            return None
+        return self._replay(link, base, digest)
+
+    def _replay(self, link: dict, base: bytes, digest: str) -> bytes | None:
+        try:
+            data = self.replay(base, link["patch"])
+        except (ValueError, UnicodeDecodeError) as exc:
+            LOGGER.warning("Cannot replay patch from backup %s: %s", link["name"], exc)
+            return None
+        if hashlib.sha256(data).hexdigest() != digest:
+            LOGGER.warning("Replaying backup %s did not reproduce %s", link["name"], digest)
+            return None
+        return data
+
+    def read_all(self, entries: list[dict] | None = None):
+        """Yield (entry, data) for entries (default: the retained ones), oldest first.
+
+        read_entry() replays a patch chain from its base on every call; walking
+        in order instead keeps each state only until the last entry that
+        replays from it, so every patch is applied once. data is None for an
+        entry that cannot be rebuilt.
+        """
+
+        with self._lock:
+            self._sync()
+            if entries is None:
+                entries = self._entries[-BACKUP_KEEP:]
+            entries = list(entries)
+            links = dict(self._links)
+
+        # Last position that replays from each base state
+        last_use: dict[str, int] = {}
+        for position, entry in enumerate(entries):
+            link = links.get(entry["hash"])
+            if link is not None:
+                last_use[link["hash"]] = position
+
+        states: dict[str, bytes] = {}
+        for position, entry in enumerate(entries):
+            digest = entry["hash"]
+            data = states.get(digest)
+            if data is None:
+                try:
+                    data = gzip.decompress(self._object_path(digest).read_bytes())
+                except FileNotFoundError:
+                    link = links.get(digest)
+                    base = states.get(link["hash"]) if link is not None and self.replay is not None else None
+                    data = self._replay(link, base, digest) if base is not None else self.read_entry(entry)
+            if data is not None and last_use.get(digest, -1) > position:
+                states[digest] = data
+            link = links.get(digest)
+            if link is not None and last_use.get(link["hash"]) == position:
+                states.pop(link["hash"], None)
+            yield entry, data
+
+
+CONTENT_BACKUPS = BackupStore(CONTENT_BACKUP_DIR, "content.json.old.", replay=replay_content_patch)
+CADDYFILE_BACKUPS = BackupStore(BACKUP_DIR, "Caddyfile.old.")
+
+
+def local_interface_addresses() -> list[str]:
+    """Non-loopback interface addresses, read from /proc like `hostname -I` but without a fork."""
+
+    addresses: list[str] = []
+    try:
+        last = None
+        for line in Path("/proc/net/fib_trie").read_text().splitlines():
+            line = line.strip()
+            if line.startswith("|-- "):
+                last = line[4:]
+            elif line == "/32 host LOCAL" and last and not last.startswith("127.") and last not in addresses:
+                addresses.append(last)
+    except OSError:
+        pass
+
+    try:
+        for line in Path("/proc/net/if_inet6").read_text().splitlines():
+            fields = line.split()
+            # Scope 00 is global; skip link-local and loopback like hostname -I does
+            if len(fields) >= 4 and fields[3] == "00":
+                address = socket.inet_ntop(socket.AF_INET6, bytes.fromhex(fields[0]))
+                if address not in addresses:
+                    addresses.append(address)
+    except (OSError, ValueError):
+        pass
+
+    if not addresses:
+        try:
+            addresses.append(socket.gethostbyname(socket.gethostname()))
+        except OSError:
+            pass
+    return addresses
+
+
+def docker_info() -> dict:
+    is_docker = Path("/.dockerenv").exists()
+    container_id = None
+
+    try:
+        cgroup_path = Path("/proc/self/cgroup")
+        if cgroup_path.exists():
+            for line in cgroup_path.read_text().splitlines():
+                parts = line.split("/")
+                if parts:
+                    candidate = parts[-1]
+                    if len(candidate) >= 12:
+                        container_id = candidate[-12:]
+                        break
+    except Exception:
+        pass
+
+    return {
+        "detected": is_docker,
+        "containerId": container_id,
+    }
+
+
+class HostFacts:
+    """Server addresses and container facts, served from memory and refreshed in the background once stale."""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._facts: dict | None = None
+        self._fetched_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def refresh(self) -> dict:
+        facts = {"serverIps": local_interface_addresses(), "docker": docker_info()}
+        with self._lock:
+            self._facts = facts
+            self._fetched_at = time.monotonic()
+            self._refreshing = False
+        return facts
+
+    def get(self) -> dict:
+        with self._lock:
+            facts = self._facts
+            stale = facts is not None and time.monotonic() - self._fetched_at > self.ttl
+            start = stale and not self._refreshing
+            if start:
+                self._refreshing = True
+        if facts is None:
+            return self.refresh()
+        if start:
+            threading.Thread(target=self.refresh, name="host-facts", daemon=True).start()
+        return facts
+
+
+HOST_FACTS = HostFacts(HOST_INFO_TTL)
+
+
+class HealthProber:
+    """Probes every landing-page item URL on a jittered interval and publishes one shared snapshot.
+
+    Hosts are probed in parallel on a bounded pool; URLs on the same host reuse
+    one keep-alive connection across cycles. With several workers, whichever
+    one takes the lock first probes and the rest serve its snapshot. A service
+    whose certificate does not verify (`tls internal`, self-signed) still
+    answered, so it counts as up with the certificate error attached.
+    """
+
+    def __init__(self, interval: float, timeout: float, workers: int, verify_tls: bool = True):
+        self.interval = interval
+        self.timeout = timeout
+        self.workers = workers
+        self._connections: dict[tuple[str, str, int], http.client.HTTPConnection] = {}
+        self._executor: ThreadPoolExecutor | None = None
+        self._thread: threading.Thread | None = None
+        self._ssl_context = ssl.create_default_context()
+        if not verify_tls:
+            self._ssl_context.check_hostname = False
+            self._ssl_context.verify_mode = ssl.CERT_NONE
+
+    def targets(self) -> list[str]:
+        entry = FILE_CACHE.get(RUNTIME_CONTENT)
+        if entry is None:
+            return []
+        try:
+            document = CONTENT_DOCUMENT.get(entry)
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return []
+        urls = []
+        for item in document.get("items", []) if isinstance(document, dict) else []:
+            url = item.get("url") if isinstance(item, dict) else None
+            if isinstance(url, str) and url.startswith(("http://", "https://")) and url not in urls:
+                urls.append(url)
+        return urls
+
+    def _connection(self, key: tuple[str, str, int]) -> http.client.HTTPConnection:
+        connection = self._connections.get(key)
+        if connection is None:
+            scheme, host, port = key
+            if scheme == "https":
+                connection = http.client.HTTPSConnection(host, port, timeout=self.timeout, context=self._ssl_context)
+            else:
+                connection = http.client.HTTPConnection(host, port, timeout=self.timeout)
+            self._connections[key] = connection
+        return connection
+
+    def _drop(self, key: tuple[str, str, int]) -> None:
+        connection = self._connections.pop(key, None)
+        if connection is not None:
+            connection.close()
+
+    def _probe_host(self, key: tuple[str, str, int], urls: list[str]) -> dict[str, dict]:
+        results = {}
+        for url in urls:
+            parsed = urlparse(url)
+            target = (parsed.path or "/") + (f"?{parsed.query}" if parsed.query else "")
+            started = time.perf_counter()
+            try:
+                connection = self._connection(key)
+                connection.request("HEAD", target, headers={"User-Agent": "caddyLander-health"})
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+                if status in (405, 501):
+                    # Some services refuse HEAD; a GET answers the question but its body is not worth draining
+                    connection.request("GET", target, headers={"User-Agent": "caddyLander-health"})
+                    status = connection.getresponse().status
+                    self._drop(key)
+                elif response.will_close:
+                    self._drop(key)
+                results[url] = {
+                    "up": status < 500,
+                    "status": status,
+                    "latencyMs": round((time.perf_counter() - started) * 1000, 1),
+                    "error": None,
+                }
+            except ssl.SSLCertVerificationError as exc:
+                self._drop(key)
+                results[url] = {
+                    "up": True,
+                    "status": None,
+                    "latencyMs": round((time.perf_counter() - started) * 1000, 1),
+                    "error": f"untrusted certificate: {exc.verify_message or exc}",
+                }
+            except (OSError, http.client.HTTPException) as exc:
+                self._drop(key)
+                results[url] = {"up": False, "status": None, "latencyMs": None, "error": str(exc) or type(exc).__name__}
+            results[url]["checkedAt"] = time.time()
+        return results
+
+    def probe_once(self) -> dict:
+        by_host: dict[tuple[str, str, int], list[str]] = {}
+        for url in self.targets():
+            parsed = urlparse(url)
+            try:
+                port = parsed.port or (443 if parsed.scheme == "https" else 80)
+            except ValueError:
+                continue
+            if parsed.hostname:
+                by_host.setdefault((parsed.scheme, parsed.hostname, port), []).append(url)
+
+        executor = self._executor or ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="health")
+        try:
+            futures = [executor.submit(self._probe_host, key, urls) for key, urls in by_host.items()]
+            services = {}
+            for future in futures:
+                services.update(future.result())
+        finally:
+            if executor is not self._executor:
+                executor.shutdown()
+
+        snapshot = {"checkedAt": time.time(), "interval": self.interval, "services": services}
+        _write_atomic(HEALTH_SNAPSHOT, json.dumps(snapshot).encode("utf-8"))
+        FILE_CACHE.invalidate(HEALTH_SNAPSHOT)
+        return snapshot
+
+    def _snapshot_age(self) -> float:
+        try:
+            return time.time() - HEALTH_SNAPSHOT.stat().st_mtime
+        except OSError:
+            return float("inf")
+
+    def _run(self) -> None:
+        while True:
+            try:
+                with file_lock("health", blocking=False) as acquired:
+                    # Another worker may have just finished a cycle
+                    if acquired and self._snapshot_age() >= self.interval / 2:
+                        self.probe_once()
+            except Exception:
+                LOGGER.exception("Health probe cycle failed")
+            time.sleep(self.interval * random.uniform(0.8, 1.2))
+
+    def start(self) -> None:
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="health")
+        self._thread = threading.Thread(target=self._run, name="health-prober", daemon=True)
+        self._thread.start()
+
+
+HEALTH_PROBER = HealthProber(HEALTH_PROBE_INTERVAL, HEALTH_PROBE_TIMEOUT, HEALTH_PROBE_WORKERS, HEALTH_PROBE_VERIFY_TLS)
+
+
+class Inotify:
+    """Minimal ctypes binding for Linux inotify; raises OSError where the kernel or libc lacks it."""
+
+    # IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    MASK = 0x008 | 0x040 | 0x080 | 0x100 | 0x200
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        try:
+            self.fd = self._libc.inotify_init1(os.O_CLOEXEC | os.O_NONBLOCK)
+        except AttributeError:
+            raise OSError("inotify is not available") from None
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._watches: dict[int, Path] = {}
+
+    def ensure(self, directory: Path) -> None:
+        if directory in self._watches.values() or not directory.is_dir():
+            return
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(directory), self.MASK)
+        if wd >= 0:
+            self._watches[wd] = directory
+
+    def wait(self, names: set[str], timeout: float) -> bool:
+        """Block until one of ``names`` changes in a watched directory, or the timeout passes."""
+
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return False
+        relevant = False
+        offset = 0
+        while offset + self.EVENT.size <= len(data):
+            wd, mask, _, length = self.EVENT.unpack_from(data, offset)
+            offset += self.EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & self.IN_IGNORED:
+                self._watches.pop(wd, None)
+            relevant = relevant or bool(mask & self.IN_Q_OVERFLOW) or name in names
+        return relevant
+
+
+class ChangeBroker:
+    """Fans change events out to event-stream subscribers through bounded per-client queues.
+
+    A client that stops reading loses its oldest queued events instead of
+    growing memory. Events carry the full new version, so skipping one never
+    leaves a client with a stale view once a later event arrives. The last
+    `reserved` slots only admit admin streams, so public clients are turned
+    away first and cannot lock the admin page out of live updates.
+    """
+
+    def __init__(self, queue_size: int, max_clients: int, reserved: int = 0):
+        self.queue_size = queue_size
+        self.max_clients = max_clients
+        self.reserved = reserved
+        self._subscribers: dict[queue.Queue, frozenset[str]] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, topics, admin: bool = False) -> queue.Queue | None:
+        limit = self.max_clients if admin else self.max_clients - self.reserved
+        with self._lock:
+            if len(self._subscribers) >= limit:
+                return None
+            subscription = queue.Queue(maxsize=self.queue_size)
+            self._subscribers[subscription] = frozenset(topics)
+            return subscription
+
+    def open_streams(self) -> int:
+        return len(self._subscribers)
+
+    def unsubscribe(self, subscription: queue.Queue) -> None:
+        with self._lock:
+            self._subscribers.pop(subscription, None)
+
+    def publish(self, event: dict) -> None:
+        with self._lock:
+            self._next_id += 1
+            event["id"] = self._next_id
+            targets = [subscription for subscription, topics in self._subscribers.items() if event["type"] in topics]
+        for subscription in targets:
+            self._offer(subscription, event)
+
+    def close(self) -> None:
+        """Ends every open stream; used on shutdown so stream threads do not hold the process open."""
+
+        with self._lock:
+            self.max_clients = 0
+            targets = list(self._subscribers)
+        for subscription in targets:
+            self._offer(subscription, None)
+
+    @staticmethod
+    def _offer(subscription: queue.Queue, event: dict | None) -> None:
+        while True:
+            try:
+                subscription.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    subscription.get_nowait()
+                except queue.Empty:
+                    pass
+
+
+class ChangeWatcher:
+    """Publishes a change event whenever content.json, the Caddyfile or a favicon gets a new version.
+
+    One thread per process follows the parent directories with inotify and
+    falls back to stat polling where inotify is unavailable. A version is the
+    digest the file is served with as its ETag, so clients can compare it
+    directly with what they loaded.
+    """
+
+    FILES = (
+        ("content", RUNTIME_CONTENT),
+        ("caddyfile", CADDYFILE_PATH),
+        ("favicon", RUNTIME_STATIC / "favicon.svg"),
+        ("favicon", RUNTIME_STATIC / "favicon.ico"),
+    )
+    # Even with inotify, recheck now and then for writes it cannot see (e.g. network filesystems)
+    RESCAN_INTERVAL = 30.0
+
+    def __init__(self, broker: ChangeBroker, mode: str, interval: float):
+        self.broker = broker
+        self.mode = mode
+        self.interval = interval
+        self.backend: str | None = None
+        self._versions: dict[Path, str | None] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def check(self) -> list[dict]:
+        events = []
+        with self._lock:
+            for kind, path in self.FILES:
+                entry = FILE_CACHE.get(path)
+                version = entry.digest if entry is not None else None
+                if path in self._versions and self._versions[path] != version:
+                    events.append({
+                        "type": kind,
+                        "file": path.name,
+                        "version": version,
+                        "previous": self._versions[path],
+                        "timestamp": time.time(),
+                    })
+                self._versions[path] = version
+        if any(event["type"] == "favicon" for event in events):
+            STATIC_INDEX.refresh()
+        for event in events:
+            LOGGER.info("%s changed (version %s)", event["file"], event["version"])
+            self.broker.publish(event)
+        return events
+
+    def snapshot(self, topics) -> list[dict]:
+        self.check()
+        with self._lock:
+            return [
+                {"type": kind, "file": path.name, "version": self._versions.get(path)}
+                for kind, path in self.FILES
+                if kind in topics
+            ]
+
+    def _run(self) -> None:
+        notifier = None
+        if self.mode != "poll":
+            try:
+                notifier = Inotify()
+            except OSError as exc:
+                LOGGER.info("inotify unavailable (%s); polling for changes every %ss", exc, self.interval)
+        self.backend = "inotify" if notifier is not None else "poll"
+
+        directories = {path.parent for _, path in self.FILES}
+        names = {path.name for _, path in self.FILES} | {directory.name for directory in directories}
+        while True:
+            try:
+                if notifier is not None:
+                    for directory in directories:
+                        notifier.ensure(directory)
+                    if notifier.wait(names, self.RESCAN_INTERVAL):
+                        # Let a burst of writes (temp file, rename, chmod) settle into one event
+                        time.sleep(0.05)
+                        notifier.wait(names, 0)
+                else:
+                    time.sleep(self.interval)
+                self.check()
+            except Exception:
+                LOGGER.exception("Change watcher cycle failed")
+                time.sleep(self.interval)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self.check()
+        self._thread = threading.Thread(target=self._run, name="change-watcher", daemon=True)
+        self._thread.start()
+
+
+# Under the asyncio engine each open stream holds a handler thread, so leave half the pool for requests
+SSE_STREAM_LIMIT = min(SSE_MAX_CLIENTS, max(1, ASYNC_WORKERS // 2)) if SERVER_ENGINE == "asyncio" else SSE_MAX_CLIENTS
+CHANGE_BROKER = ChangeBroker(
+    SSE_QUEUE_SIZE,
+    SSE_STREAM_LIMIT,
+    min(SSE_ADMIN_CLIENTS, max(1, SSE_STREAM_LIMIT // 2)),
+)
+CHANGE_WATCHER = ChangeWatcher(CHANGE_BROKER, CHANGE_WATCH, CHANGE_POLL_INTERVAL)
+
+class RequestProfiler:
+    """Profiles the next N dispatched requests, optionally only those for one route, with cProfile.
+
+    While disarmed, dispatch pays a single attribute read. Only one request is
+    profiled at a time because the interpreter allows one active profiler;
+    requests arriving meanwhile run normally and do not use up the count. Each
+    profile is kept in PROFILE_DIR as .pstats plus a text report, newest PROFILE_KEEP only.
+    """
+
+    ID_PATTERN = re.compile(r"\d{8}-\d{6}-\d+-\d+")
+    EXCLUDED = frozenset({"/api/admin/profiles", "/api/admin/profile"})
+
+    def __init__(self, root: Path, keep: int):
+        self.root = root
+        self.keep = keep
+        self.armed = False
+        self.remaining = 0
+        self.route: str | None = None
+        self.memory = False
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._busy = threading.Lock()
+
+    def arm(self, count: int, route: str | None, memory: bool) -> dict:
+        with self._lock:
+            self.remaining = count
+            self.route = route
+            self.memory = memory
+            self.armed = count > 0
+        return self.status()
+
+    def status(self) -> dict:
+        with self._lock:
+            return {"armed": self.armed, "remaining": self.remaining, "route": self.route, "memory": self.memory}
+
+    def run(self, request_handler, path: str, handler, args: tuple):
+        if path in self.EXCLUDED or not self._busy.acquire(blocking=False):
+            return handler(*args)
+        try:
+            with self._lock:
+                claimed = self.remaining > 0 and self.route in (None, path)
+                if claimed:
+                    self.remaining -= 1
+                    self.armed = self.remaining > 0
+                    self._sequence += 1
+                    sequence, memory = self._sequence, self.memory
+            if not claimed:
+                return handler(*args)
+            return self._profile(request_handler, path, handler, args, sequence, memory)
+        finally:
+            self._busy.release()
+
+    def _profile(self, request_handler, path: str, handler, args: tuple, sequence: int, memory: bool):
+        started_tracing = memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start(10)
+        if memory:
+            tracemalloc.reset_peak()
+            before = self._snapshot()
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            return profile.runcall(handler, *args)
+        finally:
+            elapsed = time.perf_counter() - started
+            allocations = None
+            if memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                allocations = (peak, self._snapshot().compare_to(before, "lineno")[:25])
+                if started_tracing:
+                    tracemalloc.stop()
+            try:
+                self._save(request_handler, path, sequence, elapsed, profile, allocations)
+            except OSError:
+                LOGGER.exception("Failed to save request profile")
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+    def _save(self, request_handler, path: str, sequence: int, elapsed: float, profile, allocations) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        profile_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{sequence}"
+        status = getattr(request_handler, "response_status", 0)
+        profile.dump_stats(self.root / f"{profile_id}.pstats")
+
+        report = io.StringIO()
+        report.write(f"{request_handler.command} {path} -> {status} in {elapsed * 1000:.1f} ms\n\n")
+        pstats.Stats(profile, stream=report).sort_stats("cumulative").print_stats(60)
+        if allocations is not None:
+            peak, top = allocations
+            report.write(f"\nPeak traced memory: {peak / 1024:.1f} KiB\nLargest allocation changes:\n")
+            report.writelines(f"{stat}\n" for stat in top)
+        (self.root / f"{profile_id}.txt").write_text(report.getvalue(), encoding="utf-8")
+
+        # Written last, so listings never show a profile whose files are incomplete
+        meta = {
+            "id": profile_id,
+            "method": request_handler.command,
+            "route": path,
+            "status": status,
+            "durationMs": round(elapsed * 1000, 1),
+            "memoryPeak": allocations[0] if allocations is not None else None,
+            "timestamp": time.time(),
+        }
+        (self.root / f"{profile_id}.json").write_text(json.dumps(meta), encoding="utf-8")
+        LOGGER.info("Profiled %s %s in %.1f ms as %s", request_handler.command, path, elapsed * 1000, profile_id)
+        self._prune()
+
+    def listing(self) -> list[dict]:
+        profiles = []
+        for meta_path in self.root.glob("*.json"):
+            try:
+                profiles.append(json.loads(meta_path.read_text(encoding="utf-8")))
+            except (OSError, json.JSONDecodeError):
+                continue
+        return sorted(profiles, key=lambda meta: meta.get("timestamp", 0), reverse=True)
+
+    def _prune(self) -> None:
+        for meta in self.listing()[self.keep:]:
+            for suffix in (".json", ".pstats", ".txt"):
+                (self.root / f"{meta['id']}{suffix}").unlink(missing_ok=True)
+
+    def path_for(self, profile_id: str | None, fmt: str) -> Path | None:
+        if not profile_id or not self.ID_PATTERN.fullmatch(profile_id) or fmt not in {"pstats", "txt"}:
+            return None
+        path = self.root / f"{profile_id}.{fmt}"
+        return path if path.is_file() else None
+
+
+PROFILER = RequestProfiler(PROFILE_DIR, PROFILE_KEEP)
+
+
+def collect_runtime_metrics(totals: dict):
+    yield "caddylander_threads", (), threading.active_count()
+    yield "caddylander_event_streams_open", (), CHANGE_BROKER.open_streams()
+    yield "caddylander_file_cache_bytes", (), FILE_CACHE.stats()["bytes"]
+
+    validation = CADDY_VALIDATOR.stats()
+    lookups = {"validation": (validation["hits"], validation["misses"])}
+    for name in CACHE_HIT:
+        hits = totals.get(("caddylander_cache_requests_total", CACHE_HIT[name]), 0)
+        lookups[name] = (hits, totals.get(("caddylander_cache_requests_total", CACHE_MISS[name]), 0))
+    yield "caddylander_cache_requests_total", (("cache", "validation"), ("result", "hit")), validation["hits"]
+    yield "caddylander_cache_requests_total", (("cache", "validation"), ("result", "miss")), validation["misses"]
+    for name, (hits, misses) in lookups.items():
+        if hits + misses:
+            yield "caddylander_cache_hit_ratio", (("cache", name),), hits / (hits + misses)
+
+
+METRICS.collector(collect_runtime_metrics)
+
+ADMIN_INFO_STATIC = {
+    "defaultPassword": ADMIN_PASSWORD == DEFAULT_ADMIN_PASSWORD,
+    "buildVersion": BUILD_VERSION,
+    "backupKeep": BACKUP_KEEP,
+    "links": {
+        "github": "https://github.com/mythosaz/caddyLander"
+    },
+}
+
+
+class Route:
+    __slots__ = ("handler", "auth", "with_url", "args", "max_body", "stream")
+
+    def __init__(
+        self,
+        handler: str,
+        auth: bool = False,
+        with_url: bool = False,
+        args: tuple = (),
+        max_body: int = SMALL_BODY_BYTES,
+        stream: bool = False,
+    ):
+        self.handler = handler
+        self.auth = auth
+        self.with_url = with_url
+        self.args = args
+        self.max_body = max_body
+        # Responses that stay open until the client leaves; never profiled
+        self.stream = stream
+
+
+ROUTES: dict[str, dict[str, Route]] = {
+    "GET": {
+        "/": Route("_serve_landing"),
+        "/admin": Route("_serve_admin_page", auth=True),
+        "/api/admin/info": Route("_serve_admin_info", auth=True),
+        "/api/admin/content/generate": Route("_serve_generated_content", auth=True),
+        "/api/content": Route("_serve_content"),
+        "/api/status": Route("_serve_status"),
+        "/metrics": Route("_serve_metrics", auth=True),
+        "/api/events": Route("_serve_events", args=("content", "favicon"), stream=True),
+        "/api/admin/events": Route(
+            "_serve_admin_events", auth=True, args=("content", "caddyfile", "favicon"), stream=True
+        ),
+        "/admin/caddyfile": Route("_serve_caddyfile", auth=True),
+        "/api/admin/content/backups": Route("_serve_content_backups", auth=True, with_url=True),
+        "/api/admin/content/backup": Route("_serve_content_backup", auth=True, with_url=True),
+        "/api/admin/caddyfile/backups": Route("_serve_caddyfile_backups", auth=True, with_url=True),
+        "/api/admin/caddyfile/backup": Route("_serve_caddyfile_backup", auth=True, with_url=True),
+        "/api/admin/full-backup": Route("_serve_full_backup", auth=True, with_url=True),
+        "/api/admin/profiles": Route("_serve_profiles", auth=True),
+        "/api/admin/profile": Route("_serve_profile", auth=True, with_url=True),
+        "/favicon.svg": Route("_serve_favicon", args=("favicon.svg", "image/svg+xml")),
+        "/favicon.ico": Route("_serve_favicon", args=("favicon.ico", "image/x-icon")),
+        "/static/favicon.svg": Route("_serve_favicon", args=("favicon.svg", "image/svg+xml")),
+        "/static/favicon.ico": Route("_serve_favicon", args=("favicon.ico", "image/x-icon")),
+    },
+    "POST": {
+        "/api/upload": Route("_handle_content_upload", auth=True, max_body=MAX_BODY_BYTES),
+        "/admin/caddyfile": Route("_handle_caddyfile_update", auth=True, max_body=MAX_BODY_BYTES),
+        "/api/admin/caddyfile/validate": Route(
+            "_handle_caddyfile_validate", auth=True, with_url=True, max_body=MAX_BODY_BYTES
+        ),
+        "/api/admin/content/restore": Route("_handle_content_restore", auth=True),
+        "/api/admin/content/sync": Route("_handle_content_sync", auth=True, with_url=True),
+        "/api/admin/favicon": Route("_handle_favicon_upload", auth=True, with_url=True, max_body=FAVICON_MAX_BYTES),
+        "/api/admin/favicon/restore": Route("_handle_favicon_restore", auth=True, with_url=True),
+        "/api/admin/caddyfile/restore": Route("_handle_caddyfile_restore", auth=True),
+        "/api/admin/content/backups/reconcile": Route("_handle_content_backups_reconcile", auth=True),
+        "/api/admin/caddyfile/backups/reconcile": Route("_handle_caddyfile_backups_reconcile", auth=True),
+        "/api/admin/profiles": Route("_handle_profiles_arm", auth=True),
+    },
+    "PATCH": {
+        "/api/content": Route("_handle_content_patch", auth=True, max_body=MAX_BODY_BYTES),
+    },
+}
+
+# Successful hits on these are sampled by ACCESS_LOG_SAMPLE; everything else is always logged
+SAMPLED_ROUTES = frozenset({
+    "static",
+    *(path for path, route in ROUTES["GET"].items() if route.handler == "_serve_favicon"),
+})
+
+
+class ChunkedWriter:
+    """Write-only file object that frames output with HTTP/1.1 chunked transfer encoding."""
+
+    def __init__(self, wfile, chunk_size: int = 64 * 1024):
+        self._wfile = wfile
+        self._chunk_size = chunk_size
+        self._buffer = bytearray()
+
+    def write(self, data) -> int:
+        self._buffer += data
+        if len(self._buffer) >= self._chunk_size:
+            self._emit()
+        return len(data)
+
+    def flush(self) -> None:
+        self._emit()
+
+    def _emit(self) -> None:
+        if not self._buffer:
+            return
+        self._wfile.write(b"%x\r\n" % len(self._buffer) + bytes(self._buffer) + b"\r\n")
+        self._buffer.clear()
+
+    def close(self) -> None:
+        self._emit()
+        self._wfile.write(b"0\r\n\r\n")
+
+
+class CountingWriter:
+    """Pass-through response sink that counts the bytes written, for metrics."""
+
+    def __init__(self, wfile):
+        self._wfile = wfile
+        self.written = 0
+
+    @property
+    def closed(self) -> bool:
+        return self._wfile.closed
+
+    def write(self, data) -> int:
+        self.written += len(data)
+        return self._wfile.write(data)
+
+    def flush(self) -> None:
+        self._wfile.flush()
+
+    def close(self) -> None:
+        self._wfile.close()
+
+
+class HashingReader:
+    def __init__(self, source):
+        self._source = source
+        self._hash = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._source.read(size)
+        self._hash.update(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+class RequestBodyError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class BodyReader:
+    """Incremental request-body reader with a size cap, a read deadline and a running SHA-256.
+
+    Understands both Content-Length and chunked bodies. Oversized declared
+    lengths are refused before anything is read.
+    """
+
+    def __init__(self, request_handler: http.server.BaseHTTPRequestHandler, limit: int):
+        self._handler = request_handler
+        self._rfile = request_handler.rfile
+        self._connection = getattr(request_handler, "connection", None)
+        self._deadline = time.monotonic() + BODY_READ_TIMEOUT
+        self._hash = hashlib.sha256()
+        self.limit = limit
+        self.received = 0
+        self.chunked = "chunked" in request_handler.headers.get("Transfer-Encoding", "").lower()
+        self._chunk_open = False
+        self._remaining = 0
+        self.done = False
+
+        if not self.chunked:
+            try:
+                self._remaining = int(request_handler.headers.get("Content-Length", "0"))
+            except ValueError:
+                raise RequestBodyError(400, "Invalid Content-Length") from None
+            if self._remaining < 0:
+                raise RequestBodyError(400, "Invalid Content-Length")
+            if self._remaining > limit:
+                raise RequestBodyError(413, f"Request body is larger than {limit} bytes")
+            if self._remaining == 0:
+                self._finish()
+
+    def _recv(self, size: int = 0) -> bytes:
+        if self._connection is not None:
+            remaining = self._deadline - time.monotonic()
+            if remaining <= 0:
+                raise RequestBodyError(408, "Timed out reading the request body")
+            self._connection.settimeout(min(remaining, KEEPALIVE_TIMEOUT))
+        try:
+            # read1 issues at most one recv, so the deadline is re-checked between packets
+            data = self._rfile.read1(size) if size else self._rfile.readline(1024)
+        except (socket.timeout, TimeoutError):
+            raise RequestBodyError(408, "Timed out reading the request body") from None
+        if not data:
+            raise RequestBodyError(400, "Request body ended early")
+        return data
+
+    def _finish(self) -> None:
+        self.done = True
+        self._handler.body_complete = True
+        if self._connection is not None:
+            self._connection.settimeout(self._handler.timeout)
+
+    def _line(self) -> bytes:
+        # _recv reads at most 1024 bytes of a line; anything longer must not be parsed as if complete
+        line = self._recv()
+        if not line.endswith(b"\r\n"):
+            raise RequestBodyError(400, "Malformed chunked body")
+        return line
+
+    def _next_chunk(self) -> bool:
+        if self._chunk_open and self._line() != b"\r\n":
+            raise RequestBodyError(400, "Malformed chunked body")  # data past the declared chunk size
+        size_text = self._line().split(b";", 1)[0].strip()
+        try:
+            size = int(size_text, 16)
+        except ValueError:
+            raise RequestBodyError(400, "Malformed chunked body") from None
+        if size == 0:
+            while self._line() != b"\r\n":
+                pass  # trailers
+            self._finish()
+            return False
+        self._remaining = size
+        self._chunk_open = True
+        return True
+
+    def read(self, size: int = 65536) -> bytes:
+        if self.done:
+            return b""
+        if self._remaining == 0 and not self._next_chunk():
+            return b""
+        data = self._recv(min(size, self._remaining))
+        self._remaining -= len(data)
+        self.received += len(data)
+        if self.received > self.limit:
+            raise RequestBodyError(413, f"Request body is larger than {self.limit} bytes")
+        self._hash.update(data)
+        self._handler.body_read += len(data)
+        if not self.chunked and self._remaining == 0:
+            self._finish()
+        return data
+
+    def read_all(self) -> bytes:
+        parts = []
+        while data := self.read():
+            parts.append(data)
+        return b"".join(parts)
+
+    def spool(self, path: Path, check=None) -> int:
+        """Stream the body into path (fsynced), calling check(chunk) on each piece as it arrives.
+
+        Once the body is complete, check(b"", final=True) lets it reject a truncated tail.
+        """
+
+        with open(path, "wb") as f:
+            while data := self.read():
+                if check is not None:
+                    check(data)
+                f.write(data)
+            if check is not None:
+                check(b"", final=True)
+            f.flush()
+            os.fsync(f.fileno())
+        return self.received
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+def _utf8_checker():
+    decoder = codecs.getincrementaldecoder("utf-8")()
+
+    def check(data: bytes, final: bool = False) -> None:
+        try:
+            decoder.decode(data, final)
+        except UnicodeDecodeError:
+            raise RequestBodyError(400, "Request body must be UTF-8 text") from None
+
+    return check
+
+
+def read_body(request_handler: http.server.BaseHTTPRequestHandler) -> bytes:
+    return BodyReader(request_handler, request_handler.body_limit).read_all()
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    timeout = KEEPALIVE_TIMEOUT
+    disable_nagle_algorithm = True
+
+    def log_request(self, code="-", size="-"):
+        # Written once the request is finished, with structured fields, by _record_request
+        pass
+
+    def log_error(self, format, *args):
+        if self.request_started is not None:
+            self.error_message = format % args
+        else:
+            self.log_message(format, *args)
+
+    def log_message(self, format, *args):
+        LOGGER.info("%s - %s", self.address_string(), format % args)
+
+    def _client_ip(self) -> str:
+        forwarded = self.headers.get("X-Forwarded-For", "") if self.request_parsed else ""
+        return forwarded.split(",", 1)[0].strip() or self.client_address[0]
+
+    def setup(self):
+        if self.request.family == socket.AF_UNIX:
+            self.disable_nagle_algorithm = False
+        super().setup()
+        self.wfile = CountingWriter(self.wfile)
+        self.requests_served = 0
+        METRICS.inc("caddylander_http_connections_open")
+
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            METRICS.inc("caddylander_http_connections_open", amount=-1)
+
+    def handle_one_request(self):
+        self.body_read = 0
+        self.body_complete = False
+        self.body_limit = SMALL_BODY_BYTES
+        self.request_parsed = False
+        self.request_started = None
+        self.route_label = "unmatched"
+        self.response_status = 0
+        self.auth_user = None
+        self.error_message = None
+        self.requests_served += 1
+        try:
+            super().handle_one_request()
+        finally:
+            if self.request_started is not None:
+                self._record_request()
+        if not self.close_connection and self.request_parsed:
+            self._discard_unread_body()
+
+    def parse_request(self):
+        # The clock starts once the request line is in, so idle keep-alive time is not counted
+        self.request_started = time.perf_counter()
+        self.response_offset = self.wfile.written
+        METRICS.inc("caddylander_http_requests_in_flight")
+        self.request_parsed = super().parse_request()
+        return self.request_parsed
+
+    def _record_request(self):
+        elapsed = time.perf_counter() - self.request_started
+        sent = self.wfile.written - self.response_offset
+        route = (("route", self.route_label),)
+        method = self.command if self.command in ROUTES else "other"
+        METRICS.inc("caddylander_http_requests_in_flight", amount=-1)
+        METRICS.inc(
+            "caddylander_http_requests_total",
+            (("method", method), ("route", self.route_label), ("status", str(self.response_status))),
+        )
+        METRICS.observe("caddylander_http_request_duration_seconds", elapsed, route)
+        if self.body_read:
+            METRICS.inc("caddylander_http_request_body_bytes_total", route, self.body_read)
+        METRICS.inc("caddylander_http_response_bytes_total", route, sent)
+
+        if not ACCESS_LOG:
+            return
+        if self.route_label in SAMPLED_ROUTES and self.response_status < 400 and random.random() >= ACCESS_LOG_SAMPLE:
+            return
+        client = self._client_ip()
+        ACCESS_LOGGER.info('%s "%s" %s %s', client, self.requestline, self.response_status, sent, extra={"fields": {
+            "event": "access",
+            "method": self.command,
+            "path": getattr(self, "path", "").split("?", 1)[0],
+            "route": self.route_label,
+            "status": self.response_status,
+            "durationMs": round(elapsed * 1000, 2),
+            "bytesIn": self.body_read,
+            "bytesOut": sent,
+            "client": client,
+            "peer": self.client_address[0],
+            "user": self.auth_user,
+            "userAgent": self.headers.get("User-Agent") if self.request_parsed else None,
+            "error": self.error_message,
+        }})
+
+    def _audit(self, action: str, target: Path, saved: CachedFile | None = None, **details):
+        """Record a change to the Caddyfile, content or assets as a separate audit event."""
+
+        AUDIT_LOGGER.info("%s %s by %s", action, target.name, self.auth_user or "-", extra={"fields": {
+            "event": "audit",
+            "action": action,
+            "file": target.name,
+            "version": saved.digest if saved is not None else None,
+            "user": self.auth_user,
+            "client": self._client_ip(),
+            **details,
+        }})
+
+    def send_response_only(self, code, message=None):
+        self.response_status = code
+        super().send_response_only(code, message)
+
+    def _unread_body_length(self) -> int:
+        if not self.request_parsed:
+            return 0
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            return 0 if self.body_complete else -1
+        try:
+            length = int(self.headers.get("Content-Length", "0"))
+        except ValueError:
+            return -1
+        return max(length - self.body_read, 0)
+
+    def _discard_unread_body(self):
+        remaining = self._unread_body_length()
+        if remaining == 0:
+            return
+        if remaining < 0 or remaining > KEEPALIVE_DRAIN_MAX:
+            self.close_connection = True
+            return
+        self.body_read += len(self.rfile.read(remaining))
+
+    def end_headers(self):
+        if not self.close_connection:
+            unread = self._unread_body_length()
+            if self.requests_served >= KEEPALIVE_MAX_REQUESTS or unread < 0 or unread > KEEPALIVE_DRAIN_MAX:
+                self.send_header("Connection", "close")
+            elif self.request_version == "HTTP/1.0":
+                self.send_header("Connection", "keep-alive")
+        super().end_headers()
+
+    def send_error(self, code, message=None, explain=None):
+        # The stock implementation always closes the connection; keep it open
+        # when the request itself was well-formed so clients can reuse it.
+        if not self.request_parsed or code >= 500 or code in {408, 413}:
+            return super().send_error(code, message, explain)
+
+        short, long = self.responses.get(code, ("???", "???"))
+        message = message or short
+        explain = explain or long
+        self.log_error("code %d, message %s", code, message)
+        self.send_response(code, message)
+        body = (self.error_message_format % {
+            "code": code,
+            "message": html.escape(message, quote=False),
+            "explain": html.escape(explain, quote=False),
+        }).encode("UTF-8", "replace")
+        self.send_header("Content-Type", self.error_content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+    def _dispatch(self, method: str):
+        parsed = urlparse(self.path)
+        route = ROUTES[method].get(parsed.path)
+        if route is None:
+            if method == "GET":
+                static_entry = STATIC_INDEX.lookup(parsed.path)
+                if static_entry is not None:
+                    self.route_label = "static"
+                    return self._serve_file(*static_entry)
+            allowed = [other for other, table in ROUTES.items() if parsed.path in table]
+            if allowed:
+                self.send_response(405)
+                self.send_header("Allow", ", ".join(allowed))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_error(404)
+            return
+
+        self.route_label = parsed.path
+        if route.auth and not self._require_auth():
+            return
+        self.body_limit = route.max_body
+        handler = getattr(self, route.handler)
+        args = (parsed, *route.args) if route.with_url else route.args
+        try:
+            if PROFILER.armed and not route.stream:
+                return PROFILER.run(self, parsed.path, handler, args)
+            return handler(*args)
+        except RequestBodyError as exc:
+            # The rest of the body is in an unknown state, so never reuse this connection
+            self.close_connection = True
+            self.send_error(exc.status, str(exc))
+
+    def _serve_landing(self):
+        if LANDING_RENDER != "server":
+            return self._serve_file(STATIC_DIR / "index.html", "text/html")
+        return self._send_cached(LANDING_CACHE.get(), "text/html")
+
+    def _serve_file(self, path: Path, content_type: str):
+        return self._send_cached(FILE_CACHE.get(path), content_type)
+
+    def _send_cached(self, entry: CachedFile | None, content_type: str):
+        if entry is None:
+            self.send_error(404)
+            return
+
+        encoding = negotiate_encoding(self.headers.get("Accept-Encoding"), entry.variants)
+        etag = entry.variant_etag(encoding)
+
+        if self._is_not_modified(entry):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", entry.last_modified)
+            self.send_header("Cache-Control", "no-cache")
+            if entry.variants:
+                self.send_header("Vary", "Accept-Encoding")
+            self.end_headers()
+            return
+
+        data = entry.variants[encoding] if encoding else entry.data
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        if entry.variants:
+            self.send_header("Vary", "Accept-Encoding")
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", entry.last_modified)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_payload(self, data: bytes, content_type: str, status: int = 200):
+        """Send a dynamic response body, compressing it on the fly when worthwhile."""
+
+        encoding = None
+        if len(data) >= COMPRESS_MIN_BYTES:
+            encoding = negotiate_encoding(
+                self.headers.get("Accept-Encoding"),
+                ("br", "gzip") if brotli is not None else ("gzip",),
+            )
+        if encoding:
+            data = compress_payload(data, encoding, level=4 if encoding == "br" else 6)
+
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        if encoding:
+            self.send_header("Content-Encoding", encoding)
+        self.send_header("Vary", "Accept-Encoding")
+        self.end_headers()
+        self.wfile.write(data)
+
+    @staticmethod
+    def _etag_matches(header: str, entry: CachedFile | None) -> bool:
+        if entry is None:
+            return False
+        candidates = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+        for encoding in ("br", "gzip"):
+            candidates = [tag.replace(f"-{encoding}\"", '"') for tag in candidates]
+        return "*" in candidates or entry.etag in candidates
+
+    def _is_not_modified(self, entry: CachedFile) -> bool:
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return self._etag_matches(if_none_match, entry)
+
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                since = parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError, IndexError, OverflowError):
+                return False
+            return entry.mtime <= since
+
+        return False
+
+    def _check_if_match(self, path: Path) -> bool:
+        """Reject a write with 412 when the client's If-Match no longer names the file on disk."""
+
+        if_match = self.headers.get("If-Match")
+        if if_match is None or self._etag_matches(if_match, FILE_CACHE.get(path)):
+            return True
+        current = FILE_CACHE.get(path)
+        response = json.dumps({
+            "success": False,
+            "stage": "conflict",
+            "output": f"{path.name} was changed by someone else. Reload it before saving.",
+        }).encode()
+        self.send_response(412)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        if current is not None:
+            self.send_header("ETag", current.etag)
+        self.end_headers()
+        self.wfile.write(response)
+        return False
+
+    def _serve_admin_page(self):
+        return self._serve_file(STATIC_DIR / "admin.html", "text/html")
+
+    def _serve_content(self):
+        return self._serve_file(RUNTIME_CONTENT, "application/json")
+
+    def _serve_status(self):
+        # A snapshot left over from when probing was on would otherwise keep showing stale dots
+        entry = FILE_CACHE.get(HEALTH_SNAPSHOT) if HEALTH_PROBE_INTERVAL > 0 else None
+        if entry is None:
+            empty = {"checkedAt": None, "interval": HEALTH_PROBE_INTERVAL, "services": {}}
+            self._send_payload(json.dumps(empty).encode(), "application/json")
+            return
+        self._send_cached(entry, "application/json")
+
+    def _serve_events(self, *topics: str):
+        self._stream_events(topics, admin=False)
+
+    def _serve_admin_events(self, *topics: str):
+        self._stream_events(topics, admin=True)
+
+    def _stream_events(self, topics: tuple[str, ...], admin: bool):
+        subscription = CHANGE_BROKER.subscribe(topics, admin)
+        if subscription is None:
+            self.send_response(503)
+            self.send_header("Retry-After", "5")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        try:
+            # Subscribe before taking the snapshot so no change can fall between the two
+            snapshot = CHANGE_WATCHER.snapshot(topics)
+            self.close_connection = True
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("X-Accel-Buffering", "no")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self._send_event("snapshot", {"files": snapshot})
+            while True:
+                try:
+                    event = subscription.get(timeout=SSE_HEARTBEAT)
+                except queue.Empty:
+                    self.wfile.write(b": ping\n\n")
+                    self.wfile.flush()
+                    continue
+                if event is None:
+                    return
+                self._send_event("change", event)
+        except OSError:
+            pass
+        finally:
+            CHANGE_BROKER.unsubscribe(subscription)
+
+    def _send_event(self, name: str, payload: dict):
+        frame = f"event: {name}\n"
+        if "id" in payload:
+            frame += f"id: {payload['id']}\n"
+        frame += f"data: {json.dumps(payload)}\n\n"
+        self.wfile.write(frame.encode())
+        self.wfile.flush()
+
+    def _serve_metrics(self):
+        self._send_payload(METRICS.render(), "text/plain; version=0.0.4; charset=utf-8")
+
+    def _serve_profiles(self):
+        payload = {**PROFILER.status(), "profiles": PROFILER.listing()}
+        self._send_payload(json.dumps(payload).encode(), "application/json")
+
+    def _handle_profiles_arm(self):
+        raw_body = read_body(self)
+        try:
+            payload = json.loads(raw_body.decode("utf-8") or "{}")
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            self.send_error(400, "Invalid JSON payload")
+            return
+        if not isinstance(payload, dict):
+            self.send_error(400, "Expected a JSON object")
+            return
+
+        count = payload.get("count", 1)
+        route = payload.get("route") or None
+        if not isinstance(count, int) or isinstance(count, bool) or not 0 <= count <= PROFILE_MAX_REQUESTS:
+            self.send_error(400, f"count must be between 0 and {PROFILE_MAX_REQUESTS}")
+            return
+        if route is not None and not any(route in table for table in ROUTES.values()):
+            self.send_error(400, "Unknown route")
+            return
+        if route is not None and any(table[route].stream for table in ROUTES.values() if route in table):
+            self.send_error(400, "Streaming routes cannot be profiled")
+            return
+
+        status = PROFILER.arm(count, route, bool(payload.get("memory", False)))
+        if count:
+            LOGGER.info("Profiling the next %s request(s)%s", count, f" to {route}" if route else "")
+        else:
+            LOGGER.info("Request profiling disarmed")
+        self._send_payload(json.dumps(status).encode(), "application/json")
+
+    def _serve_profile(self, parsed_url):
+        params = parse_qs(parsed_url.query)
+        fmt = params.get("format", ["txt"])[0]
+        path = PROFILER.path_for(params.get("id", [None])[0], fmt)
+        try:
+            data = path.read_bytes() if path is not None else None
+        except OSError:
+            data = None
+        if data is None:
+            self.send_error(404, "Profile not found")
+            return
+
+        if fmt == "txt":
+            self._send_payload(data, "text/plain; charset=utf-8")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Disposition", f"attachment; filename=\"{path.name}\"")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _serve_favicon(self, name: str, mime: str):
+        target = RUNTIME_STATIC / name if STATIC_INDEX.has_runtime(name) else STATIC_DIR / name
+        return self._serve_file(target, mime)
+
+    def _require_auth(self) -> bool:
+        self.auth_user = None
+        if not ADMIN_PASSWORD:
+            return True
+
+        header = self.headers.get("Authorization", "")
+        if header.startswith("Basic "):
+            try:
+                decoded = base64.b64decode(header.removeprefix("Basic ").strip()).decode()
+                username, password = decoded.split(":", 1)
+            except Exception:
+                username, password = None, None
+
+            if password == ADMIN_PASSWORD:
+                self.auth_user = username
+                return True
+
+        self.send_response(401)
+        self.send_header("WWW-Authenticate", 'Basic realm="caddyLander"')
+        self.send_header("Content-Length", "0")
         self.end_headers()
-        self.wfile.write(data)
+        return False
 
-    def _collect_status(self) -> dict:
+    def _serve_admin_info(self):
         forwarded_for = self.headers.get("X-Forwarded-For")
         client_ip = self.client_address[0] if self.client_address else None
-        internal_ips = self._get_internal_ips()
-
-        return {
-            "clientIp": forwarded_for.split(",")[0].strip() if forwarded_for else client_ip,
-            "clientChain": forwarded_for,
-            "serverIps": internal_ips,
-            "docker": self._get_docker_info(),
+        info = {
+            **ADMIN_INFO_STATIC,
+            "status": {
+                **HOST_FACTS.get(),
+                "clientIp": forwarded_for.split(",")[0].strip() if forwarded_for else client_ip,
+                "clientChain": forwarded_for,
+            },
+            "validation": CADDY_VALIDATOR.stats(),
         }
+        self._send_payload(json.dumps(info).encode(), "application/json")
+
+    def _serve_caddyfile(self):
+        entry = FILE_CACHE.get(CADDYFILE_PATH)
+        if entry is None:
+            self._send_payload(b"", "text/plain")
+            return
+        self._send_cached(entry, "text/plain")
 
-    def _get_internal_ips(self) -> list[str]:
+    def _handle_content_upload(self):
+        raw_body = read_body(self)
         try:
-            result = subprocess.run([
-                "hostname",
-                "-I",
-            ], capture_output=True, text=True, check=False)
-            output = result.stdout.strip()
-            if output:
-                return [ip for ip in output.split() if ip]
-        except Exception:
-            pass
+            if self.headers.get_content_type() == "application/json":
+                new_content = raw_body.decode("utf-8")
+            else:
+                data = parse_qs(raw_body.decode("utf-8"), errors="strict")
+                new_content = data.get("content", [None])[0]
+        except UnicodeDecodeError:
+            self.send_error(400, "Request body must be UTF-8 text")
+            return
+        if new_content is None:
+            self.send_error(400, "Missing content")
+            return
 
         try:
-            hostname = socket.gethostname()
-            ip = socket.gethostbyname(hostname)
-            if ip:
-                return [ip]
-        except Exception:
-            pass
+            parsed_json = json.loads(new_content)
+        except json.JSONDecodeError:
+            self.send_error(400, "Invalid JSON payload")
+            return
 
-        return []
+        with file_lock("content"):
+            if not self._check_if_match(RUNTIME_CONTENT):
+                return
 
-    def _get_docker_info(self) -> dict:
-        is_docker = Path("/.dockerenv").exists()
-        container_id = None
+            previous_content = ""
+            if RUNTIME_CONTENT.exists():
+                previous_content = RUNTIME_CONTENT.read_text(encoding="utf-8")
 
-        try:
-            cgroup_path = Path("/proc/self/cgroup")
-            if cgroup_path.exists():
-                for line in cgroup_path.read_text().splitlines():
-                    parts = line.split("/")
-                    if parts:
-                        candidate = parts[-1]
-                        if len(candidate) >= 12:
-                            container_id = candidate[-12:]
-                            break
-        except Exception:
-            pass
+            if previous_content:
+                self._backup_content(previous_content, "upload")
 
-        return {
-            "detected": is_docker,
-            "containerId": container_id,
-        }
+            _write_atomic(RUNTIME_CONTENT, serialize_content(parsed_json))
+            FILE_CACHE.invalidate(RUNTIME_CONTENT)
+            saved = FILE_CACHE.get(RUNTIME_CONTENT)
+        LANDING_CACHE.invalidate()
+        export_static_site()
 
-    def _serve_caddyfile(self):
-        content = ""
-        if CADDYFILE_PATH.exists():
-            existing = CADDYFILE_PATH.read_text(encoding="utf-8")
-            if existing:
-                content = existing
+        LOGGER.info("Saved landing content (%s bytes)", len(raw_body))
+        self._audit("content.save", RUNTIME_CONTENT, saved, bytes=len(raw_body))
 
-        data = content.encode("utf-8")
+        response = json.dumps({"status": "ok"}).encode()
         self.send_response(200)
-        self.send_header("Content-Type", "text/plain")
-        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response)))
+        if saved is not None:
+            self.send_header("ETag", saved.etag)
         self.end_headers()
-        self.wfile.write(data)
+        self.wfile.write(response)
 
-    def _handle_content_upload(self):
+    def _handle_content_patch(self):
         raw_body = read_body(self)
-        data = parse_qs(raw_body.decode())
-        new_content = data.get("content", [None])[0]
-        if new_content is None:
-            self.send_error(400, "Missing content")
+        if self.headers.get_content_type() not in ("application/json-patch+json", "application/json"):
+            self.send_error(415, "Use Content-Type: application/json-patch+json")
             return
-
         try:
-            parsed_json = json.loads(new_content)
-        except json.JSONDecodeError:
+            operations = json.loads(raw_body.decode("utf-8"))
+        except (UnicodeDecodeError, json.JSONDecodeError):
             self.send_error(400, "Invalid JSON payload")
             return
 
-        previous_content = ""
-        if RUNTIME_CONTENT.exists():
-            previous_content = RUNTIME_CONTENT.read_text(encoding="utf-8")
-
-        if previous_content:
-            self._backup_content(previous_content)
+        with file_lock("content"):
+            if not self._check_if_match(RUNTIME_CONTENT):
+                return
+            entry = FILE_CACHE.get(RUNTIME_CONTENT)
+            if entry is None:
+                self.send_error(404, "content.json not found")
+                return
+            try:
+                document = apply_json_patch(CONTENT_DOCUMENT.get(entry), operations)
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                self.send_error(409, "content.json is not valid JSON; replace it with a full upload")
+                return
+            except JsonPatchError as exc:
+                self.send_error(exc.status, str(exc))
+                return
+            if not isinstance(document, dict):
+                self.send_error(422, "content.json must remain a JSON object")
+                return
 
-        with open(RUNTIME_CONTENT, "w", encoding="utf-8") as f:
-            json.dump(parsed_json, f, ensure_ascii=False, indent=2)
+            data = serialize_content(document)
+            if data != entry.data:
+                self._backup_content(
+                    entry.data.decode("utf-8"), "patch", operations, hashlib.sha256(data).hexdigest()
+                )
+                _write_atomic(RUNTIME_CONTENT, data)
+                FILE_CACHE.invalidate(RUNTIME_CONTENT)
+            saved = FILE_CACHE.get(RUNTIME_CONTENT)
+            if saved is not None:
+                CONTENT_DOCUMENT.put(saved, document)
 
-        LOGGER.info("Saved landing content (%s bytes)", len(raw_body))
+        if data != entry.data:
+            LANDING_CACHE.invalidate()
+            export_static_site()
+            LOGGER.info("Patched landing content (%s operations)", len(operations))
+            self._audit("content.patch", RUNTIME_CONTENT, saved, operations=len(operations))
 
-        response = json.dumps({"status": "ok"}).encode()
+        response = json.dumps({"status": "ok", "changed": data != entry.data}).encode()
         self.send_response(200)
         self.send_header("Content-Type", "application/json")
         self.send_header("Content-Length", str(len(response)))
+        if saved is not None:
+            self.send_header("ETag", saved.etag)
         self.end_headers()
         self.wfile.write(response)
 
@@ -342,8 +3573,7 @@ class Handler(http.server.BaseHTTPRequestHandler):
             self.send_error(404, "Caddyfile not found")
             return
 
-        caddy_text = CADDYFILE_PATH.read_text(encoding="utf-8")
-        hosts = self._parse_caddy_hosts(caddy_text)
+        hosts = self._parse_caddy_hosts(CADDYFILE_PATH)
 
         if not hosts:
             self.send_error(400, "No hostnames discovered in Caddyfile")
@@ -374,33 +3604,102 @@ class Handler(http.server.BaseHTTPRequestHandler):
         payload = {**defaults, "items": generated_items + fallback_items}
 
         data = json.dumps(payload, ensure_ascii=False, indent=2).encode("utf-8")
+        self._send_payload(data, "application/json")
+
+    def _handle_content_sync(self, parsed_url):
+        dry_run = parse_qs(parsed_url.query).get("dryRun", ["0"])[0] not in ("0", "false", "")
+        if not CADDYFILE_PATH.exists():
+            self.send_error(404, "Caddyfile not found")
+            return
+        hosts = self._parse_caddy_hosts(CADDYFILE_PATH)
+
+        with file_lock("content"):
+            if not self._check_if_match(RUNTIME_CONTENT):
+                return
+            entry = FILE_CACHE.get(RUNTIME_CONTENT)
+            try:
+                document = CONTENT_DOCUMENT.get(entry) if entry is not None else {}
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                self.send_error(409, "content.json is not valid JSON; fix it before syncing")
+                return
+            if not isinstance(document, dict):
+                self.send_error(409, "content.json must be a JSON object; fix it before syncing")
+                return
+            # The cached document is shared, so work on shallow copies; diff_discovered_hosts
+            # copies any item it changes.
+            items = document.get("items")
+            items = list(items) if isinstance(items, list) else []
+            content = {**document, "items": items}
+            index, discovered_at = CONTENT_URL_INDEX.get(entry, items) if entry is not None else ({}, {})
+
+            appended = len(items)
+            changes = diff_discovered_hosts(items, index, discovered_at, hosts)
+            changed = any(changes.values())
+            if changed and not dry_run:
+                self._backup_content(entry.data.decode("utf-8") if entry is not None else "", "sync")
+                _write_atomic(RUNTIME_CONTENT, serialize_content(content))
+                FILE_CACHE.invalidate(RUNTIME_CONTENT)
+            saved = FILE_CACHE.get(RUNTIME_CONTENT)
+            if changed and not dry_run and saved is not None:
+                # Carry the parse and the indexes over to the new version instead of rebuilding them
+                CONTENT_DOCUMENT.put(saved, content)
+                index, discovered_at = dict(index), dict(discovered_at)
+                for position in range(appended, len(items)):
+                    key = normalize_item_url(items[position]["url"])
+                    index[key] = discovered_at[key] = position
+                CONTENT_URL_INDEX.put(saved, index, discovered_at)
+
+        if changed and not dry_run:
+            LANDING_CACHE.invalidate()
+            export_static_site()
+            LOGGER.info(
+                "Synced discovered hosts: %s added, %s stale, %s restored",
+                len(changes["added"]), len(changes["stale"]), len(changes["restored"]),
+            )
+            self._audit(
+                "content.sync", RUNTIME_CONTENT, saved,
+                added=len(changes["added"]), stale=len(changes["stale"]), restored=len(changes["restored"]),
+            )
+
+        payload = {**changes, "discovered": len(hosts), "applied": changed and not dry_run}
+        response = json.dumps(payload).encode()
         self.send_response(200)
         self.send_header("Content-Type", "application/json")
-        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Content-Length", str(len(response)))
+        if saved is not None:
+            self.send_header("ETag", saved.etag)
         self.end_headers()
-        self.wfile.write(data)
+        self.wfile.write(response)
 
     def _handle_caddyfile_update(self):
-        raw_body = read_body(self)
-        new_content = raw_body.decode("utf-8")
-
-        LOGGER.info("Received Caddyfile update (%s bytes)", len(raw_body))
+        # Fail fast on a stale editor before reading the body or spending time in
+        # caddy; the check is repeated under the lock below, just before the file
+        # is replaced.
+        if not self._check_if_match(CADDYFILE_PATH):
+            return
 
-        # Step 1: Write to temp file
-        TEMP_CADDYFILE.write_text(new_content, encoding="utf-8")
+        # Step 1: Stream the upload to a private temp file, hashing it on the way
+        reader = BodyReader(self, self.body_limit)
+        with tempfile.TemporaryDirectory(prefix="caddylander-upload-") as workdir:
+            upload = Path(workdir) / "Caddyfile.upload"
+            reader.spool(upload, check=_utf8_checker())
+            LOGGER.info("Received Caddyfile update (%s bytes)", reader.received)
 
-        # Step 2: Format
-        result = subprocess.run(
-            [str(CADDY_BIN), "fmt", "--overwrite", str(TEMP_CADDYFILE)],
-            capture_output=True,
-            text=True
-        )
-        if result.returncode != 0:
-            LOGGER.warning("Caddyfile fmt failed: %s", result.stderr.strip())
+            # Steps 2-3: Format and validate (cached by content hash)
+            result = CADDY_VALIDATOR.validate_upload(upload, reader.hexdigest())
+        if not result["success"]:
+            LOGGER.warning(
+                "Caddyfile %s failed%s: %s",
+                "fmt" if result["stage"] == "fmt" else "validation",
+                " (cached)" if result["cached"] else "",
+                result["output"].strip(),
+            )
+            self._audit("caddyfile.save", CADDYFILE_PATH, outcome="rejected", stage=result["stage"], bytes=reader.received)
             response = json.dumps({
                 "success": False,
-                "stage": "fmt",
-                "output": result.stderr
+                "stage": result["stage"],
+                "output": result["output"],
+                "cached": result["cached"],
             }).encode()
             self.send_response(200)
             self.send_header("Content-Type", "application/json")
@@ -409,41 +3708,31 @@ class Handler(http.server.BaseHTTPRequestHandler):
             self.wfile.write(response)
             return
 
-        # Step 3: Validate (using adapt for syntax-only validation)
-        result = subprocess.run(
-            [str(CADDY_BIN), "adapt", "--adapter", "caddyfile", "--config", str(TEMP_CADDYFILE)],
-            capture_output=True,
-            text=True
-        )
-        if result.returncode != 0:
-            LOGGER.warning("Caddyfile validation failed: %s", result.stderr.strip())
-            response = json.dumps({
-                "success": False,
-                "stage": "validate",
-                "output": result.stderr
-            }).encode()
-            self.send_response(200)
-            self.send_header("Content-Type", "application/json")
-            self.send_header("Content-Length", str(len(response)))
-            self.end_headers()
-            self.wfile.write(response)
-            return
+        if result["cached"]:
+            LOGGER.info("Caddyfile validation succeeded (cached)")
+        else:
+            LOGGER.info("Caddyfile validation succeeded in %sms", result["durationMs"])
 
-        LOGGER.info("Caddyfile validation succeeded")
+        with file_lock("caddyfile"):
+            if not self._check_if_match(CADDYFILE_PATH):
+                return
 
-        # Step 4: Backup previous version if exists
-        CADDYFILE_PATH.parent.mkdir(parents=True, exist_ok=True)
-        previous_content = ""
-        if CADDYFILE_PATH.exists():
-            previous_content = CADDYFILE_PATH.read_text(encoding="utf-8")
+            # Step 4: Backup previous version if exists
+            CADDYFILE_PATH.parent.mkdir(parents=True, exist_ok=True)
+            previous_content = ""
+            if CADDYFILE_PATH.exists():
+                previous_content = CADDYFILE_PATH.read_text(encoding="utf-8")
 
-        if previous_content:
-            self._backup_caddyfile(previous_content)
+            if previous_content:
+                self._backup_caddyfile(previous_content, "save")
 
-        # Step 5: Promote temp to real file
-        shutil.move(str(TEMP_CADDYFILE), str(CADDYFILE_PATH))
+            # Step 5: Promote the formatted text to the real file
+            _write_atomic(CADDYFILE_PATH, result["formatted"].encode("utf-8"))
+            FILE_CACHE.invalidate(CADDYFILE_PATH)
+            saved = FILE_CACHE.get(CADDYFILE_PATH)
 
         LOGGER.info("Saved validated Caddyfile to %s", CADDYFILE_PATH)
+        self._audit("caddyfile.save", CADDYFILE_PATH, saved, outcome="applied", bytes=reader.received)
 
         # Step 6: Success (Caddy reload must be done externally)
         response = json.dumps({
@@ -454,44 +3743,42 @@ class Handler(http.server.BaseHTTPRequestHandler):
         self.send_response(200)
         self.send_header("Content-Type", "application/json")
         self.send_header("Content-Length", str(len(response)))
+        if saved is not None:
+            self.send_header("ETag", saved.etag)
         self.end_headers()
         self.wfile.write(response)
 
-    def _backup_content(self, previous_content: str):
-        CONTENT_BACKUP_DIR.mkdir(parents=True, exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-        backup_path = CONTENT_BACKUP_DIR / f"content.json.old.{timestamp}"
-        backup_path.write_text(previous_content, encoding="utf-8")
-
-        LOGGER.info("Created content backup %s", backup_path)
+    def _handle_caddyfile_validate(self, parsed_url):
+        try:
+            new_content = read_body(self).decode("utf-8")
+        except UnicodeDecodeError:
+            self.send_error(400, "Request body must be UTF-8 text")
+            return
+        session = parse_qs(parsed_url.query).get("session", [None])[0] or self.headers.get("X-Editor-Session", "")
+        key = (self.auth_user, session or self.client_address[0])
 
-        backups = sorted(
-            CONTENT_BACKUP_DIR.glob("content.json.old.*"),
-            key=lambda p: p.stat().st_mtime,
-            reverse=True,
-        )
-        for old_backup in backups[10:]:
-            old_backup.unlink(missing_ok=True)
+        ticket = LINT_SESSIONS.start(key)
+        try:
+            time.sleep(LINT_DEBOUNCE)
+            result = CADDY_VALIDATOR.validate(new_content, ticket)
+        finally:
+            LINT_SESSIONS.finish(key, ticket)
 
-    def _resolve_backup(self, name: str) -> Path | None:
-        candidate = (CONTENT_BACKUP_DIR / name).resolve()
-        if not candidate.is_file():
-            return None
-        if not candidate.is_relative_to(CONTENT_BACKUP_DIR.resolve()):
-            return None
-        if not candidate.name.startswith("content.json.old."):
-            return None
-        return candidate
+        if result.get("cancelled"):
+            payload = {"success": False, "cancelled": True, "diagnostics": []}
+        else:
+            payload = {
+                "success": result["success"],
+                "stage": result["stage"],
+                "cached": result["cached"],
+                "diagnostics": [] if result["success"] else parse_caddy_diagnostics(result["output"], result["stage"]),
+            }
+        self._send_payload(json.dumps(payload).encode(), "application/json")
 
-    def _resolve_caddy_backup(self, name: str) -> Path | None:
-        candidate = (BACKUP_DIR / name).resolve()
-        if not candidate.is_file():
-            return None
-        if not candidate.is_relative_to(BACKUP_DIR.resolve()):
-            return None
-        if not candidate.name.startswith("Caddyfile.old."):
-            return None
-        return candidate
+    def _backup_content(self, previous_content: str, source: str, patch: list | None = None, patched: str | None = None):
+        entry = CONTENT_BACKUPS.add(previous_content.encode("utf-8"), source, patch, patched)
+        if entry is not None:
+            LOGGER.info("Created content backup %s", entry["name"])
 
     def _handle_content_restore(self):
         raw_body = read_body(self)
@@ -506,16 +3793,12 @@ class Handler(http.server.BaseHTTPRequestHandler):
             self.send_error(400, "Missing backup name")
             return
 
-        target = self._resolve_backup(name)
-        if target is None:
+        backup_data = CONTENT_BACKUPS.read(name)
+        if backup_data is None:
             self.send_error(404, "Backup not found")
             return
 
-        previous_content = ""
-        if RUNTIME_CONTENT.exists():
-            previous_content = RUNTIME_CONTENT.read_text(encoding="utf-8")
-
-        backup_text = target.read_text(encoding="utf-8")
+        backup_text = backup_data.decode("utf-8")
 
         try:
             parsed_json = json.loads(backup_text)
@@ -523,13 +3806,24 @@ class Handler(http.server.BaseHTTPRequestHandler):
             self.send_error(500, "Selected backup is invalid JSON")
             return
 
-        if previous_content:
-            self._backup_content(previous_content)
+        with file_lock("content"):
+            if not self._check_if_match(RUNTIME_CONTENT):
+                return
+
+            previous_content = ""
+            if RUNTIME_CONTENT.exists():
+                previous_content = RUNTIME_CONTENT.read_text(encoding="utf-8")
+
+            if previous_content:
+                self._backup_content(previous_content, "restore")
 
-        with open(RUNTIME_CONTENT, "w", encoding="utf-8") as f:
-            json.dump(parsed_json, f, ensure_ascii=False, indent=2)
+            _write_atomic(RUNTIME_CONTENT, serialize_content(parsed_json))
+            FILE_CACHE.invalidate(RUNTIME_CONTENT)
+        LANDING_CACHE.invalidate()
+        export_static_site()
 
         LOGGER.info("Restored landing content from backup %s", name)
+        self._audit("content.restore", RUNTIME_CONTENT, FILE_CACHE.get(RUNTIME_CONTENT), backup=name)
 
         response = json.dumps({"status": "ok"}).encode()
         self.send_response(200)
@@ -538,58 +3832,140 @@ class Handler(http.server.BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(response)
 
-    def _serve_content_backups(self):
-        backups = [
+    def _serve_content_backups(self, parsed_url):
+        self._serve_backup_listing(CONTENT_BACKUPS, parsed_url)
+
+    def _serve_backup_listing(self, store: BackupStore, parsed_url):
+        params = parse_qs(parsed_url.query)
+        try:
+            offset = max(0, int(params.get("offset", ["0"])[0]))
+            limit = int(params["limit"][0]) if "limit" in params else None
+            since = float(params["since"][0]) if "since" in params else None
+        except ValueError:
+            self.send_error(400, "offset, limit and since must be numeric")
+            return
+        if limit is not None and limit < 1:
+            self.send_error(400, "limit must be at least 1")
+            return
+
+        page = store.page(offset, limit, since)
+        page["backups"] = [
             {
-                "name": path.name,
-                "timestamp": path.stat().st_mtime,
+                "name": entry["name"],
+                "timestamp": entry["timestamp"],
+                "size": entry["size"],
+                "source": entry["source"],
             }
-            for path in sorted(
-                CONTENT_BACKUP_DIR.glob("content.json.old.*"),
-                key=lambda p: p.stat().st_mtime,
-                reverse=True,
-            )[:10]
+            for entry in page["backups"]
         ]
+        self._send_payload(json.dumps(page).encode(), "application/json")
 
-        data = json.dumps({"backups": backups}).encode()
-        self.send_response(200)
-        self.send_header("Content-Type", "application/json")
-        self.send_header("Content-Length", str(len(data)))
-        self.end_headers()
-        self.wfile.write(data)
+    def _handle_content_backups_reconcile(self):
+        with file_lock("content"):
+            result = CONTENT_BACKUPS.reconcile()
+        self._audit("backups.reconcile", CONTENT_BACKUPS.index_path, store="content", **result)
+        self._send_payload(json.dumps(result).encode(), "application/json")
 
-    def _serve_full_backup(self):
-        buffer = io.BytesIO()
-        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-        filename = f"caddylander-backup-{timestamp}.tar.gz"
+    def _handle_caddyfile_backups_reconcile(self):
+        with file_lock("caddyfile"):
+            result = CADDYFILE_BACKUPS.reconcile()
+        self._audit("backups.reconcile", CADDYFILE_BACKUPS.index_path, store="caddyfile", **result)
+        self._send_payload(json.dumps(result).encode(), "application/json")
 
-        with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
-            if RUNTIME_CONTENT.exists():
-                tar.add(RUNTIME_CONTENT, arcname="content.json")
+    def _full_backup_sources(self) -> list[tuple[Path, str]]:
+        sources = []
+        if RUNTIME_CONTENT.exists():
+            sources.append((RUNTIME_CONTENT, "content.json"))
 
-            if CADDYFILE_PATH.exists():
-                tar.add(CADDYFILE_PATH, arcname="Caddyfile")
+        if CADDYFILE_PATH.exists():
+            sources.append((CADDYFILE_PATH, "Caddyfile"))
 
-            for name in ["favicon.svg", "favicon.ico", "favicon.png"]:
-                runtime_path = RUNTIME_STATIC / name
-                static_path = STATIC_DIR / name
-                target = runtime_path if runtime_path.exists() else static_path
-                if target.exists():
-                    tar.add(target, arcname=f"favicons/{name}")
+        for name in ["favicon.svg", "favicon.ico", "favicon.png"]:
+            runtime_path = RUNTIME_STATIC / name
+            static_path = STATIC_DIR / name
+            target = runtime_path if runtime_path.exists() else static_path
+            if target.exists():
+                sources.append((target, f"favicons/{name}"))
+        return sources
 
-            for backup in sorted(CONTENT_BACKUP_DIR.glob("content.json.old.*")):
-                tar.add(backup, arcname=f"content-backups/{backup.name}")
+    def _serve_full_backup(self, parsed_url):
+        params = parse_qs(parsed_url.query)
+        archive_format = params.get("format", ["tar.gz"])[0]
+        if archive_format not in {"tar", "tar.gz"}:
+            self.send_error(400, "Specify format=tar or format=tar.gz")
+            return
+        try:
+            level = int(params.get("level", ["6"])[0])
+        except ValueError:
+            level = -1
+        if not 0 <= level <= 9:
+            self.send_error(400, "Compression level must be between 0 and 9")
+            return
 
-            for backup in sorted(BACKUP_DIR.glob("Caddyfile.old.*")):
-                tar.add(backup, arcname=f"caddyfile-backups/{backup.name}")
+        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        filename = f"caddylander-backup-{timestamp}.{archive_format}"
 
-        data = buffer.getvalue()
+        chunked = self.request_version != "HTTP/1.0"
         self.send_response(200)
-        self.send_header("Content-Type", "application/gzip")
+        self.send_header("Content-Type", "application/gzip" if archive_format == "tar.gz" else "application/x-tar")
         self.send_header("Content-Disposition", f"attachment; filename=\"{filename}\"")
-        self.send_header("Content-Length", str(len(data)))
+        if chunked:
+            self.send_header("Transfer-Encoding", "chunked")
+        else:
+            self.send_header("Connection", "close")
         self.end_headers()
-        self.wfile.write(data)
+
+        sink = ChunkedWriter(self.wfile) if chunked else self.wfile
+        started, sent = time.perf_counter(), self.wfile.written
+        manifest = []
+        try:
+            stream = gzip.GzipFile(fileobj=sink, mode="wb", compresslevel=level) if archive_format == "tar.gz" else sink
+            with tarfile.open(fileobj=stream, mode="w|") as tar:
+                for path, arcname in self._full_backup_sources():
+                    try:
+                        with open(path, "rb") as source:
+                            info = tar.gettarinfo(arcname=arcname, fileobj=source)
+                            hashing = HashingReader(source)
+                            tar.addfile(info, hashing)
+                    except FileNotFoundError:
+                        continue
+                    manifest.append({"path": arcname, "size": info.size, "sha256": hashing.hexdigest()})
+
+                for store, folder in ((CONTENT_BACKUPS, "content-backups"), (CADDYFILE_BACKUPS, "caddyfile-backups")):
+                    for entry, data in store.read_all():
+                        if data is None:
+                            continue
+                        info = tarfile.TarInfo(f"{folder}/{entry['name']}")
+                        info.size = len(data)
+                        info.mtime = int(entry["timestamp"])
+                        hashing = HashingReader(io.BytesIO(data))
+                        tar.addfile(info, hashing)
+                        manifest.append({"path": info.name, "size": info.size, "sha256": hashing.hexdigest()})
+
+                manifest_data = json.dumps({
+                    "created": datetime.now().isoformat(timespec="seconds"),
+                    "files": manifest,
+                }, indent=2).encode("utf-8")
+                info = tarfile.TarInfo("manifest.json")
+                info.size = len(manifest_data)
+                info.mtime = int(time.time())
+                tar.addfile(info, io.BytesIO(manifest_data))
+            if stream is not sink:
+                stream.close()
+            if chunked:
+                sink.close()
+        except (ConnectionError, OSError):
+            LOGGER.warning("Full backup download aborted by client")
+            self.close_connection = True
+            return
+        except Exception:
+            LOGGER.exception("Full backup failed mid-stream")
+            self.close_connection = True
+            return
+
+        METRICS.observe("caddylander_full_backup_duration_seconds", time.perf_counter() - started)
+        METRICS.observe("caddylander_full_backup_bytes", self.wfile.written - sent)
+        LOGGER.info("Streamed full backup %s (%s files)", filename, len(manifest))
 
     def _serve_content_backup(self, parsed_url):
         params = parse_qs(parsed_url.query)
@@ -598,17 +3974,12 @@ class Handler(http.server.BaseHTTPRequestHandler):
             self.send_error(400, "Missing backup name")
             return
 
-        target = self._resolve_backup(name)
-        if target is None:
+        backup_data = CONTENT_BACKUPS.read(name)
+        if backup_data is None:
             self.send_error(404, "Backup not found")
             return
 
-        data = target.read_bytes()
-        self.send_response(200)
-        self.send_header("Content-Type", "application/json")
-        self.send_header("Content-Length", str(len(data)))
-        self.end_headers()
-        self.wfile.write(data)
+        self._send_payload(backup_data, "application/json")
 
     def _handle_favicon_upload(self, parsed_url):
         params = parse_qs(parsed_url.query)
@@ -617,25 +3988,45 @@ class Handler(http.server.BaseHTTPRequestHandler):
             self.send_error(400, "Specify type=svg or type=ico")
             return
 
-        raw_body = read_body(self)
-        if not raw_body:
-            self.send_error(400, "Missing favicon payload")
-            return
+        RUNTIME_STATIC.mkdir(parents=True, exist_ok=True)
+        target_path = RUNTIME_STATIC / f"favicon.{target_type}"
+        reader = BodyReader(self, self.body_limit)
+        magic = bytearray()
+        tail = b""
+        seen_svg = False
 
-        if target_type == "svg":
-            if b"<svg" not in raw_body.lower():
+        def check(data: bytes, final: bool = False):
+            nonlocal tail, seen_svg
+            if len(magic) < 4:
+                magic.extend(data[:4 - len(magic)])
+            if target_type == "svg" and not seen_svg:
+                # Keep a small overlap so a tag split across reads is still found
+                window = tail + data.lower()
+                seen_svg = b"<svg" in window
+                tail = window[-3:]
+
+        upload = RUNTIME_STATIC / f".favicon.{target_type}.upload-{os.getpid()}-{threading.get_ident()}"
+        try:
+            size = reader.spool(upload, check)
+            if not size:
+                self.send_error(400, "Missing favicon payload")
+                return
+            if target_type == "svg" and not seen_svg:
                 self.send_error(400, "Only SVG content is allowed")
                 return
-        if target_type == "ico":
-            if len(raw_body) < 4 or raw_body[:4] != b"\x00\x00\x01\x00":
+            if target_type == "ico" and bytes(magic) != b"\x00\x00\x01\x00":
                 self.send_error(400, "Only ICO content is allowed")
                 return
-
-        RUNTIME_STATIC.mkdir(parents=True, exist_ok=True)
-        target_path = RUNTIME_STATIC / f"favicon.{target_type}"
-        target_path.write_bytes(raw_body)
+            with file_lock("favicon"):
+                os.replace(upload, target_path)
+        finally:
+            upload.unlink(missing_ok=True)
+        STATIC_INDEX.refresh()
+        FILE_CACHE.invalidate(target_path)
+        export_static_site()
 
         LOGGER.info("Uploaded custom favicon: %s", target_path)
+        self._audit("favicon.upload", target_path, FILE_CACHE.get(target_path))
 
         response = json.dumps({"status": "ok"}).encode()
         self.send_response(200)
@@ -655,13 +4046,19 @@ class Handler(http.server.BaseHTTPRequestHandler):
             targets.extend([RUNTIME_STATIC / "favicon.svg", RUNTIME_STATIC / "favicon.ico"])
 
         removed_any = False
-        for path in targets:
-            if path.exists():
-                path.unlink(missing_ok=True)
-                removed_any = True
+        with file_lock("favicon"):
+            for path in targets:
+                if path.exists():
+                    path.unlink(missing_ok=True)
+                    removed_any = True
+                FILE_CACHE.invalidate(path)
+        STATIC_INDEX.refresh()
 
         if removed_any:
             LOGGER.info("Restored bundled favicon assets")
+            for path in targets:
+                self._audit("favicon.restore", path)
+            export_static_site()
 
         response = json.dumps({"status": "ok"}).encode()
         self.send_response(200)
@@ -670,41 +4067,13 @@ class Handler(http.server.BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(response)
 
-    def _backup_caddyfile(self, previous_content: str):
-        BACKUP_DIR.mkdir(parents=True, exist_ok=True)
-        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-        backup_path = BACKUP_DIR / f"Caddyfile.old.{timestamp}"
-        backup_path.write_text(previous_content, encoding="utf-8")
-
-        LOGGER.info("Created Caddyfile backup %s", backup_path)
-
-        backups = sorted(
-            BACKUP_DIR.glob("Caddyfile.old.*"),
-            key=lambda p: p.stat().st_mtime,
-            reverse=True,
-        )
-        for old_backup in backups[10:]:
-            old_backup.unlink(missing_ok=True)
-
-    def _serve_caddyfile_backups(self):
-        backups = [
-            {
-                "name": path.name,
-                "timestamp": path.stat().st_mtime,
-            }
-            for path in sorted(
-                BACKUP_DIR.glob("Caddyfile.old.*"),
-                key=lambda p: p.stat().st_mtime,
-                reverse=True,
-            )[:10]
-        ]
+    def _backup_caddyfile(self, previous_content: str, source: str):
+        entry = CADDYFILE_BACKUPS.add(previous_content.encode("utf-8"), source)
+        if entry is not None:
+            LOGGER.info("Created Caddyfile backup %s", entry["name"])
 
-        data = json.dumps({"backups": backups}).encode()
-        self.send_response(200)
-        self.send_header("Content-Type", "application/json")
-        self.send_header("Content-Length", str(len(data)))
-        self.end_headers()
-        self.wfile.write(data)
+    def _serve_caddyfile_backups(self, parsed_url):
+        self._serve_backup_listing(CADDYFILE_BACKUPS, parsed_url)
 
     def _serve_caddyfile_backup(self, parsed_url):
         params = parse_qs(parsed_url.query)
@@ -713,17 +4082,12 @@ class Handler(http.server.BaseHTTPRequestHandler):
             self.send_error(400, "Missing backup name")
             return
 
-        target = self._resolve_caddy_backup(name)
-        if target is None:
+        backup_data = CADDYFILE_BACKUPS.read(name)
+        if backup_data is None:
             self.send_error(404, "Backup not found")
             return
 
-        data = target.read_bytes()
-        self.send_response(200)
-        self.send_header("Content-Type", "text/plain")
-        self.send_header("Content-Length", str(len(data)))
-        self.end_headers()
-        self.wfile.write(data)
+        self._send_payload(backup_data, "text/plain")
 
     def _handle_caddyfile_restore(self):
         raw_body = read_body(self)
@@ -738,24 +4102,27 @@ class Handler(http.server.BaseHTTPRequestHandler):
             self.send_error(400, "Missing backup name")
             return
 
-        target = self._resolve_caddy_backup(name)
-        if target is None:
+        backup_data = CADDYFILE_BACKUPS.read(name)
+        if backup_data is None:
             self.send_error(404, "Backup not found")
             return
 
-        previous_content = ""
-        if CADDYFILE_PATH.exists():
-            previous_content = CADDYFILE_PATH.read_text(encoding="utf-8")
+        with file_lock("caddyfile"):
+            if not self._check_if_match(CADDYFILE_PATH):
+                return
 
-        backup_text = target.read_text(encoding="utf-8")
+            previous_content = ""
+            if CADDYFILE_PATH.exists():
+                previous_content = CADDYFILE_PATH.read_text(encoding="utf-8")
 
-        if previous_content:
-            self._backup_caddyfile(previous_content)
+            if previous_content:
+                self._backup_caddyfile(previous_content, "restore")
 
-        CADDYFILE_PATH.parent.mkdir(parents=True, exist_ok=True)
-        CADDYFILE_PATH.write_text(backup_text, encoding="utf-8")
+            _write_atomic(CADDYFILE_PATH, backup_data)
+            FILE_CACHE.invalidate(CADDYFILE_PATH)
 
         LOGGER.info("Restored Caddyfile from backup %s", name)
+        self._audit("caddyfile.restore", CADDYFILE_PATH, FILE_CACHE.get(CADDYFILE_PATH), backup=name)
 
         response = json.dumps({"status": "ok", "restart_required": True}).encode()
         self.send_response(200)
@@ -764,35 +4131,15 @@ class Handler(http.server.BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(response)
 
-    def _parse_caddy_hosts(self, text: str) -> list[tuple[str, str]]:
-        hosts: list[str] = []
-        tokens: list[str] = []
-        brace_depth = 0
-
-        for raw_line in text.splitlines():
-            line = raw_line.strip()
-            if not line or line.startswith("#"):
-                continue
-            if "#" in line:
-                line = line.split("#", 1)[0].strip()
-            if not line:
-                continue
-
-            if brace_depth == 0:
-                if "{" in line:
-                    before, after = line.split("{", 1)
-                    tokens.extend(before.replace(",", " ").split())
-                    brace_depth += 1 + after.count("{")
-                    brace_depth -= after.count("}")
-                    hosts.extend(tokens)
-                    tokens = []
-                    continue
-
-                tokens.extend(line.replace(",", " ").split())
-            brace_depth += line.count("{")
-            brace_depth -= line.count("}")
-            if brace_depth < 0:
-                brace_depth = 0
+    def _parse_caddy_hosts(self, path: Path) -> list[tuple[str, str]]:
+        path = path.resolve()
+        ast = CADDYFILE_PARSES.parse_file(path)
+        if ast is None:
+            return []
+        sites, errors = expand_caddy_sites(ast, path.parent, chain=(path,))
+        for error in errors:
+            LOGGER.warning("Host discovery: %s", error)
+        hosts = [address for site in sites for address in site.addresses]
 
         cleaned: list[tuple[str, str]] = []
         seen = set()
@@ -803,7 +4150,7 @@ class Handler(http.server.BaseHTTPRequestHandler):
                 continue
             if candidate.startswith(("(", "@", ":", "/")):
                 continue
-            if candidate.startswith("unix/"):
+            if candidate.startswith("unix/") or "{" in candidate:
                 continue
 
             url = candidate
@@ -833,11 +4180,311 @@ class Handler(http.server.BaseHTTPRequestHandler):
         return cleaned
 
 
+class _LoopWriter:
+    """File-like response sink that hands buffered bytes to an asyncio stream with backpressure."""
+
+    def __init__(self, writer: asyncio.StreamWriter, loop: asyncio.AbstractEventLoop):
+        self._writer = writer
+        self._loop = loop
+        self._buffer = bytearray()
+        self.written = 0
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self.written += len(data)
+        if len(self._buffer) >= ASYNC_WRITE_CHUNK:
+            asyncio.run_coroutine_threadsafe(self.drain(), self._loop).result()
+        return len(data)
+
+    def flush(self) -> None:
+        # Event streams flush after every frame, so hand the bytes to the loop now rather than at the end
+        if self._buffer:
+            asyncio.run_coroutine_threadsafe(self.drain(), self._loop).result(KEEPALIVE_TIMEOUT)
+
+    async def drain(self) -> None:
+        if self._buffer:
+            data = bytes(self._buffer)
+            self._buffer.clear()
+            self._writer.write(data)
+        await self._writer.drain()
+
+
+class BufferedRequestHandler(Handler):
+    """Runs the regular Handler routes against a request that was read by the asyncio engine."""
+
+    def __init__(self, raw_request: bytes, client_address, wfile: _LoopWriter, requests_served: int):
+        self.rfile = io.BytesIO(raw_request)
+        self.wfile = wfile
+        self.client_address = client_address
+        self.server = None
+        self.requests_served = requests_served
+        self.close_connection = True
+        self.handle_one_request()
+
+
+def _declared_body_length(head: bytes) -> int:
+    for line in head.split(b"\r\n")[1:]:
+        name, _, value = line.partition(b":")
+        name = name.strip().lower()
+        if name == b"transfer-encoding" and b"chunked" in value.lower():
+            return -1
+        if name == b"content-length":
+            try:
+                return max(int(value.strip()), 0)
+            except ValueError:
+                return -1
+    return 0
+
+
+def _route_body_limit(head: bytes) -> int:
+    method, _, rest = head.partition(b" ")
+    target = rest.split(b" ", 1)[0].decode("latin-1")
+    route = ROUTES.get(method.decode("latin-1"), {}).get(urlparse(target).path)
+    return route.max_body if route is not None else SMALL_BODY_BYTES
+
+
+async def _read_async_body(reader: asyncio.StreamReader, head: bytes) -> tuple[bytes, bytes]:
+    """Read a request body with the route's size limit and the body deadline.
+
+    Chunked bodies are decoded here and the head is rewritten with a
+    Content-Length, so the buffered handler only ever sees a plain body.
+    """
+
+    limit = _route_body_limit(head)
+    body_length = _declared_body_length(head)
+    if body_length > limit:
+        raise RequestBodyError(413, f"Request body is larger than {limit} bytes")
+
+    async def read_body() -> bytes:
+        if body_length >= 0:
+            return await reader.readexactly(body_length) if body_length else b""
+        parts, total = [], 0
+        while True:
+            size_line = await reader.readuntil(b"\n")
+            try:
+                size = int(size_line.split(b";", 1)[0].strip(), 16)
+            except ValueError:
+                raise RequestBodyError(400, "Malformed chunked body") from None
+            if size == 0:
+                while await reader.readuntil(b"\n") not in (b"\r\n", b"\n"):
+                    pass
+                return b"".join(parts)
+            total += size
+            if total > limit:
+                raise RequestBodyError(413, f"Request body is larger than {limit} bytes")
+            parts.append(await reader.readexactly(size))
+            await reader.readuntil(b"\n")
+
+    try:
+        body = await asyncio.wait_for(read_body(), BODY_READ_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise RequestBodyError(408, "Timed out reading the request body") from None
+    except asyncio.IncompleteReadError:
+        raise RequestBodyError(400, "Request body ended early") from None
+
+    if body_length < 0:
+        lines = [
+            line for line in head[:-4].split(b"\r\n")
+            if not line.lower().startswith((b"transfer-encoding:", b"content-length:"))
+        ]
+        head = b"\r\n".join([*lines, b"Content-Length: %d" % len(body)]) + b"\r\n\r\n"
+    return head, body
+
+
+async def _handle_async_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    loop = asyncio.get_running_loop()
+    client_address = writer.get_extra_info("peername") or ("unix", 0)
+    requests_served = 0
+    METRICS.inc("caddylander_http_connections_open")
+    try:
+        while True:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT)
+            except asyncio.LimitOverrunError:
+                writer.write(b"HTTP/1.1 431 Request Header Fields Too Large\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                await writer.drain()
+                return
+            except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+                return
+
+            try:
+                head, body = await _read_async_body(reader, head)
+            except RequestBodyError as exc:
+                reason = http.server.BaseHTTPRequestHandler.responses.get(exc.status, ("Error",))[0]
+                writer.write(
+                    f"HTTP/1.1 {exc.status} {reason}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode()
+                )
+                await writer.drain()
+                return
+
+            requests_served += 1
+            sink = _LoopWriter(writer, loop)
+            handler = await loop.run_in_executor(
+                ASYNC_EXECUTOR,
+                BufferedRequestHandler,
+                head + body,
+                client_address,
+                sink,
+                requests_served,
+            )
+            await sink.drain()
+            if handler.close_connection:
+                return
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    except Exception:
+        LOGGER.exception("Unhandled error on connection from %s", client_address[0])
+    finally:
+        METRICS.inc("caddylander_http_connections_open", amount=-1)
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except Exception:
+            pass
+
+
+async def _serve_asyncio(listeners: list[socket.socket]):
+    global ASYNC_LOOP
+    ASYNC_LOOP = asyncio.get_running_loop()
+    servers = []
+    for sock in listeners:
+        if sock.family == socket.AF_UNIX:
+            servers.append(await asyncio.start_unix_server(_handle_async_connection, sock=sock))
+        else:
+            servers.append(await asyncio.start_server(_handle_async_connection, sock=sock))
+    try:
+        await asyncio.gather(*(server.serve_forever() for server in servers))
+    finally:
+        CHANGE_BROKER.close()
+
+
+ASYNC_EXECUTOR = ThreadPoolExecutor(max_workers=ASYNC_WORKERS, thread_name_prefix="caddylander")
+
+
+def serve_asyncio(listeners: list[socket.socket]) -> None:
+    asyncio.run(_serve_asyncio(listeners))
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        return request, ("unix", 0)
+
+
+def bind_tcp_listener(address: tuple[str, int], reuse_port: bool = False) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(address)
+    sock.listen(128)
+    return sock
+
+
+def bind_unix_listener(path: Path) -> socket.socket:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(str(path))
+    # Caddy usually runs as a different user in its own container.
+    os.chmod(path, 0o666)
+    sock.listen(128)
+    return sock
+
+
+def serve_listeners(listeners: list[socket.socket]) -> None:
+    # Started here rather than at startup so every pre-forked worker gets its own threads.
+    STATIC_INDEX.watch(STATIC_INDEX_INTERVAL)
+    HEALTH_PROBER.start()
+    CHANGE_WATCHER.start()
+    if SERVER_ENGINE == "asyncio":
+        serve_asyncio(listeners)
+        return
+
+    servers = []
+    for sock in listeners:
+        if sock.family == socket.AF_UNIX:
+            server = ThreadingUnixHTTPServer(sock.getsockname(), Handler, bind_and_activate=False)
+        else:
+            server = http.server.ThreadingHTTPServer(sock.getsockname(), Handler, bind_and_activate=False)
+        server.socket.close()
+        server.socket = sock
+        servers.append(server)
+
+    for server in servers[1:]:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+    servers[0].serve_forever()
+
+
+def serve_workers(address: tuple[str, int], shared: list[socket.socket], workers: int) -> None:
+    """Pre-fork workers that each bind the TCP port with SO_REUSEPORT and share any Unix socket."""
+
+    children: set[int] = set()
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                serve_listeners([bind_tcp_listener(address, reuse_port=True), *shared])
+            except Exception:
+                LOGGER.exception("Worker %s crashed", os.getpid())
+            finally:
+                LOG_PIPELINE.stop()
+                os._exit(1)
+        children.add(pid)
+
+    def stop(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if not stopping:
+            LOGGER.warning("Worker %s exited with status %s; restarting", pid, status)
+            spawn()
+
+
 if __name__ == "__main__":
-    for line in _sanitize_logo_lines(LOGO_LINES):
-        LOGGER.info(line)
+    if LOG_FORMAT != "json":
+        for line in _sanitize_logo_lines(LOGO_LINES):
+            LOGGER.info(line)
     LOGGER.info("Starting caddyLander")
     bootstrap_content()
-    server = http.server.ThreadingHTTPServer(("0.0.0.0", 8080), Handler)
-    LOGGER.info("caddylander running on port 8080")
-    server.serve_forever()
+    CONTENT_BACKUPS.migrate_legacy()
+    CADDYFILE_BACKUPS.migrate_legacy()
+    warm_static_cache()
+    HOST_FACTS.refresh()
+    STATIC_INDEX.refresh()
+    export_static_site()
+    shared_listeners = [bind_unix_listener(Path(UNIX_SOCKET))] if UNIX_SOCKET else []
+    LOGGER.info(
+        "caddylander running on port %s (%s engine, %s worker%s)%s",
+        LISTEN_ADDRESS[1],
+        SERVER_ENGINE,
+        WORKERS,
+        "" if WORKERS == 1 else "s",
+        f" and {UNIX_SOCKET}" if UNIX_SOCKET else "",
+    )
+    if WORKERS > 1:
+        serve_workers(LISTEN_ADDRESS, shared_listeners, WORKERS)
+    else:
+        serve_listeners([bind_tcp_listener(LISTEN_ADDRESS), *shared_listeners])
@@ -4,7 +4,7 @@ import { defaultHighlightStyle, syntaxHighlighting, indentOnInput, bracketMatchi
 import { defaultKeymap, history, historyKeymap } from '@codemirror/commands';
 import { searchKeymap, highlightSelectionMatches } from '@codemirror/search';
 import { autocompletion, completionKeymap, closeBrackets, closeBracketsKeymap } from '@codemirror/autocomplete';
-import { lintKeymap } from '@codemirror/lint';
+import { lintKeymap, linter } from '@codemirror/lint';
 import { oneDark } from '@codemirror/theme-one-dark';
 import { json } from '@codemirror/lang-json';
 import { StreamLanguage } from '@codemirror/language';
@@ -23,6 +23,7 @@ function getOrCreateFileState(fileName) {
   if (!fileState.has(fileName)) {
     fileState.set(fileName, {
       lastSaved: '',
+      etag: null,
       isDirty: false,
       position: { line: 1, column: 1 }
     });
@@ -50,6 +51,43 @@ function updateEditorStatusLine(fileName) {
   statusEl.textContent = `${fileName} · ${status.isDirty ? 'Dirty' : 'Saved'} · Ln ${status.position.line}, Col ${status.position.column}`;
 }
 
+// Live Caddyfile validation; each request supersedes (and aborts) the previous one
+const lintSession = Math.random().toString(36).slice(2);
+let lintController = null;
+
+const caddyfileLinter = linter(async (view) => {
+  if (lintController) lintController.abort();
+  const controller = new AbortController();
+  lintController = controller;
+
+  let result;
+  try {
+    const response = await fetch(`/api/admin/caddyfile/validate?session=${lintSession}`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'text/plain' },
+      body: view.state.doc.toString(),
+      signal: controller.signal
+    });
+    if (!response.ok) return [];
+    result = await response.json();
+  } catch (error) {
+    return [];
+  }
+  if (result.cancelled || controller.signal.aborted) return [];
+
+  const doc = view.state.doc;
+  return result.diagnostics.map((diagnostic) => {
+    const line = doc.line(Math.min(Math.max(diagnostic.line || 1, 1), doc.lines));
+    return {
+      from: line.from,
+      to: line.to,
+      severity: diagnostic.severity,
+      source: diagnostic.stage,
+      message: diagnostic.message
+    };
+  });
+}, { delay: 750 });
+
 // File type configurations
 const fileTypes = {
   'content.json': {
@@ -61,7 +99,7 @@ const fileTypes = {
     }
   },
   'Caddyfile': {
-    extension: StreamLanguage.define(nginx),
+    extension: [StreamLanguage.define(nginx), caddyfileLinter],
     endpoint: {
       get: '/admin/caddyfile',
       post: '/admin/caddyfile',
@@ -153,6 +191,7 @@ async function loadFile(fileName) {
     }
 
     // Update editor content and language
+    state.etag = response.headers.get('ETag');
     state.lastSaved = content;
     state.isDirty = false;
     editorView.dispatch({
@@ -184,6 +223,7 @@ async function saveFile() {
 
   const config = fileTypes[currentFile];
   const content = editorView.state.doc.toString();
+  const state = getOrCreateFileState(currentFile);
 
   try {
     let requestConfig;
@@ -199,8 +239,8 @@ async function saveFile() {
 
       requestConfig = {
         method: 'POST',
-        headers: { 'Content-Type': 'application/x-www-form-urlencoded' },
-        body: 'content=' + encodeURIComponent(content)
+        headers: { 'Content-Type': 'application/json' },
+        body: content
       };
     } else {
       requestConfig = {
@@ -209,13 +249,27 @@ async function saveFile() {
       };
     }
 
+    // Only save over the version this editor loaded
+    if (state.etag) {
+      requestConfig.headers = { ...requestConfig.headers, 'If-Match': state.etag };
+    }
+
     const response = await fetch(config.endpoint.post, requestConfig);
 
+    if (response.status === 412) {
+      const conflict = await response.json();
+      updateStatus(currentFile, conflict.output);
+      return;
+    }
+
     if (!response.ok) {
       throw new Error('Failed to save');
     }
 
     const result = await response.json();
+    if (response.headers.get('ETag')) {
+      state.etag = response.headers.get('ETag');
+    }
 
     // Handle new pipeline response format for Caddyfile
     if (currentFile === 'Caddyfile') {
@@ -240,7 +294,6 @@ async function saveFile() {
     if (window.refreshBackups) window.refreshBackups();
     if (window.refreshCaddyfileBackups) window.refreshCaddyfileBackups();
 
-    const state = getOrCreateFileState(currentFile);
     state.lastSaved = content;
     state.isDirty = false;
     updateEditorStatusLine(currentFile);
@@ -251,6 +304,22 @@ async function saveFile() {
   }
 }
 
+// Reconcile with a change pushed by the server; our own saves arrive here too and match the stored ETag
+async function handleRemoteChange(fileName, version) {
+  const state = getOrCreateFileState(fileName);
+  if (fileName !== currentFile || !state.etag || state.etag === `"${version}"`) {
+    return;
+  }
+
+  if (state.isDirty) {
+    updateStatus(fileName, `${fileName} changed on the server. Reload it before saving; saving now will be rejected.`);
+    return;
+  }
+
+  await loadFile(fileName);
+  updateStatus(fileName, `${fileName} changed on the server and was reloaded.`);
+}
+
 function updateStatus(fileName, message) {
   const statusId = fileName === 'content.json' ? 'content-status' : 'caddyfile-status';
   const statusElement = document.getElementById(statusId);
@@ -285,11 +354,18 @@ function setContent(content) {
   });
 }
 
+// ETag of the version loaded for fileName, for other writers that must not clobber newer saves
+function getEtag(fileName) {
+  return fileState.get(fileName)?.etag || null;
+}
+
 // Export functions for global access
 window.CaddyEditor = {
   init: initEditor,
   loadFile,
   saveFile,
   downloadFile,
-  setContent
+  setContent,
+  handleRemoteChange,
+  getEtag
 };
@@ -0,0 +1,116 @@
+import http.server
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+import server
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        if self.path == "/slow":
+            time.sleep(1)
+        if self.path == "/redirect":
+            self.send_response(301)
+            self.send_header("Location", "/elsewhere")
+        elif self.path == "/broken":
+            self.send_response(503)
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StubServers:
+    def setUp(self):
+        self.prober = server.HealthProber(60, timeout=0.3, workers=2)
+
+    def serve(self, context=None):
+        stub = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        if context is not None:
+            stub.socket = context.wrap_socket(stub.socket, server_side=True)
+        threading.Thread(target=stub.serve_forever, args=(0.05,), daemon=True).start()
+        self.addCleanup(stub.server_close)
+        self.addCleanup(stub.shutdown)
+        return stub.server_address[1]
+
+    def probe(self, prober, scheme: str, host: str, port: int, path: str) -> dict:
+        url = f"{scheme}://{host}:{port}{path}"
+        return prober._probe_host((scheme, host, port), [url])[url]
+
+
+class HealthProberTest(StubServers, unittest.TestCase):
+    def test_up(self):
+        result = self.probe(self.prober, "http", "127.0.0.1", self.serve(), "/")
+        self.assertTrue(result["up"])
+        self.assertEqual(result["status"], 200)
+        self.assertIsNone(result["error"])
+
+    def test_server_error_is_down(self):
+        result = self.probe(self.prober, "http", "127.0.0.1", self.serve(), "/broken")
+        self.assertFalse(result["up"])
+        self.assertEqual(result["status"], 503)
+
+    def test_connection_refused_is_down(self):
+        port = self.serve()
+        self.doCleanups()
+        result = self.probe(self.prober, "http", "127.0.0.1", port, "/")
+        self.assertFalse(result["up"])
+        self.assertIsNone(result["status"])
+        self.assertTrue(result["error"])
+
+    def test_timeout_is_down(self):
+        result = self.probe(self.prober, "http", "127.0.0.1", self.serve(), "/slow")
+        self.assertFalse(result["up"])
+        self.assertIn("timed out", result["error"])
+
+    def test_redirect_is_up_and_not_followed(self):
+        result = self.probe(self.prober, "http", "127.0.0.1", self.serve(), "/redirect")
+        self.assertTrue(result["up"])
+        self.assertEqual(result["status"], 301)
+
+
+@unittest.skipUnless(shutil.which("openssl"), "openssl is needed to make a self-signed certificate")
+class HealthProberTlsTest(StubServers, unittest.TestCase):
+    """The same stub behind a self-signed certificate, as with caddy's `tls internal`."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.certs = tempfile.TemporaryDirectory()
+        cert, key = Path(cls.certs.name) / "cert.pem", Path(cls.certs.name) / "key.pem"
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+             "-subj", "/CN=localhost", "-keyout", str(key), "-out", str(cert)],
+            check=True, capture_output=True,
+        )
+        cls.context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        cls.context.load_cert_chain(cert, key)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.certs.cleanup()
+
+    def test_untrusted_certificate_is_up_with_error(self):
+        result = self.probe(self.prober, "https", "localhost", self.serve(self.context), "/")
+        self.assertTrue(result["up"])
+        self.assertIsNone(result["status"])
+        self.assertIn("untrusted certificate", result["error"])
+
+    def test_unverified_probe_reports_status(self):
+        prober = server.HealthProber(60, timeout=0.3, workers=2, verify_tls=False)
+        for path, status in (("/", 200), ("/redirect", 301), ("/broken", 503)):
+            result = self.probe(prober, "https", "localhost", self.serve(self.context), path)
+            self.assertEqual(result["status"], status)
+            self.assertEqual(result["up"], status < 500)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+
+import server
+
+
+class ApplyJsonPatchTest(unittest.TestCase):
+    def test_replace_keeps_object_key_order(self):
+        document = {"items": [{"name": "NAS", "url": "https://nas.example.com", "desc": "Storage"}]}
+        patched = server.apply_json_patch(document, [{"op": "replace", "path": "/items/0/desc", "value": "Files"}])
+        self.assertEqual(list(patched["items"][0]), ["name", "url", "desc"])
+        self.assertEqual(patched["items"][0]["desc"], "Files")
+        self.assertEqual(document["items"][0]["desc"], "Storage")
+
+    def test_replace_list_element_and_whole_document(self):
+        patched = server.apply_json_patch({"items": [1, 2, 3]}, [{"op": "replace", "path": "/items/1", "value": 9}])
+        self.assertEqual(patched, {"items": [1, 9, 3]})
+        self.assertEqual(server.apply_json_patch({"a": 1}, [{"op": "replace", "path": "", "value": []}]), [])
+
+    def test_replace_missing_target_is_a_conflict(self):
+        for path in ("/items/0/missing", "/items/5"):
+            with self.assertRaises(server.JsonPatchError) as caught:
+                server.apply_json_patch({"items": [{}]}, [{"op": "replace", "path": path, "value": 1}])
+            self.assertEqual(caught.exception.status, 409)
+
+
+if __name__ == "__main__":
+    unittest.main()